@@ -2,6 +2,8 @@
 
 from flask import Flask, render_template, request, redirect, url_for, session, make_response, jsonify
 from flask_session import Session
+from cachelib.serializers import FileSystemSerializer
+import msgpack
 import os
 import re
 import io
@@ -15,7 +17,7 @@ import json
 
 # ---- project modules ----
 from nutrition.constants import TARGET_NUTRIENTS, LABEL_TO_NAME, ALLOWED_TYPES
-from nutrition.utils import today_str, get_targets, get_diary, sum_nutrients, calc_progress
+from nutrition.utils import today_str, get_targets, get_diary, sum_nutrients, calc_progress, import_session_history
 from nutrition.services.units import grams_from_local_registry, parse_line_to_qty_unit_name
 # NEW imports
 from nutrition.services.nutrients import normalize_per100, recipe_per100_from_detail
@@ -38,6 +40,7 @@ from nutrition.services.usda_client import (
     search_best_fdc_for_recipes,
 )
 from nutrition.services.food_portion_ref import build_food_portion_rows
+from nutrition.services import history_store
 
 # 3rd-party
 from fuzzywuzzy import fuzz
@@ -62,8 +65,30 @@ app.config.update(
     SESSION_USE_SIGNER=True,
 )
 
+
+class _MsgpackSessionSerializer(FileSystemSerializer):
+    """
+    msgpack for the filesystem session store: compact binary for the float-heavy
+    diary_by_food dicts. Flask-Session hands the session dict straight to
+    cachelib (SESSION_SERIALIZATION_FORMAT doesn't apply to this backend), and
+    cachelib pickles by default. Session files written before the switch are
+    pickles; they still load once and are rewritten as msgpack.
+    """
+
+    def dump(self, value, f, protocol=None):
+        f.write(msgpack.packb(value, use_bin_type=True))
+
+    def load(self, f):
+        raw = f.read()
+        try:
+            return msgpack.unpackb(raw, raw=False)
+        except (ValueError, msgpack.UnpackException):
+            return super().load(io.BytesIO(raw))
+
+
 os.makedirs(app.config["SESSION_FILE_DIR"], exist_ok=True)
 Session(app)
+app.session_interface.cache.serializer = _MsgpackSessionSerializer()
 
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret-key")  # TODO: secure in prod
 
@@ -98,9 +123,7 @@ ALL_HISTORY_NUTRIENTS = [
 
 def get_daymap(date: str) -> dict:
     """Return today's entries keyed by fdcId, e.g. {'12345': {grams, nutrients,...}}"""
-    di = session.setdefault("diary_by_food", {})
-    di.setdefault(date, {})
-    return di[date]
+    return session.setdefault("diary_by_food", {}).setdefault(date, {})
 
 
 def sum_nutrients_from_map(daymap: dict) -> dict:
@@ -565,6 +588,7 @@ def login():
             email = (request.form.get("email") or "demo@example.com").strip()
             plan  = (request.form.get("plan") or "free").strip()
             session["user"] = {"name": name, "email": email, "plan": plan}
+        import_session_history()
 
         nxt = request.args.get("next") or url_for("app_dashboard")
         return redirect(nxt)
@@ -578,6 +602,7 @@ def signup():
         email = (request.form.get("email") or "demo@example.com").strip()
         plan  = (request.form.get("plan") or "premium").strip()
         session["user"] = {"name": name, "email": email, "plan": plan}
+        import_session_history()
 
         nxt = request.args.get("next") or url_for("daily.daily")
         return redirect(nxt)
@@ -674,7 +699,7 @@ def _ensure_my_food_list():
     lst = session.get("my_food_list")
     if not isinstance(lst, list):
         lst = []
-    session["my_food_list"] = lst
+        session["my_food_list"] = lst  # only assign when missing; assignment marks the session dirty
     return lst
 
 def _coerce_float(x):
@@ -946,6 +971,11 @@ def create_app():
     app.register_blueprint(history_bp)
     app.register_blueprint(univer_bp)
     app.register_blueprint(label_bp)
+
+    @app.cli.command("backfill-history")
+    def backfill_history():
+        """Persist complete totals on every saved history day (one-off migration)."""
+        history_store.backfill_all_totals(app.instance_path)
     print("=== URL MAP ===")
     print(app.url_map)
 
@@ -973,7 +1003,7 @@ def _ensure_list():
     lst = session.get("my_food_list")
     if not isinstance(lst, list):
         lst = []
-    session["my_food_list"] = lst
+        session["my_food_list"] = lst  # only assign when missing; assignment marks the session dirty
     return lst
 
 def _find_food(fid: str):
@@ -1,9 +1,11 @@
 # app_blueprints/daily.py
-from flask import Blueprint, render_template, request, session, redirect, url_for
+from flask import Blueprint, render_template, request, session, redirect, url_for, current_app
 import re
 import datetime
-from nutrition.utils import today_str, get_targets
+from nutrition.utils import today_str, get_targets, session_user_id, import_session_history, calc_progress
 from nutrition.constants import TARGET_NUTRIENTS
+from nutrition.services import history_store
+from nutrition.services.nutrients import normalize_per100
 from nutrition.services.portions import (
     get_portions_for_fdc,
     build_hint_from_portions,
@@ -14,93 +16,16 @@ from nutrition.services.units import grams_from_local_registry
 
 daily_bp = Blueprint("daily", __name__)
 
-# --- Minimal helpers (kept local and self-contained) ----
-
-def normalize_per100(n: dict) -> dict:
-    ENERGY_KEYS_KCAL = ["Calories", "Energy (kcal)", "Energy", "calories", "Energy kcal"]
-    ENERGY_KEYS_KJ   = ["Energy (kJ)", "Energy (kj)", "kJ", "Kilojoules"]
-
-    def _coerce_calories_from_usda(n0: dict) -> float:
-        if not n0: return 0.0
-        for k in ENERGY_KEYS_KCAL:
-            v = n0.get(k)
-            if v not in (None, "", "NA"):
-                try: return float(v)
-                except: pass
-        for k in ENERGY_KEYS_KJ:
-            v = n0.get(k)
-            if v not in (None, "", "NA"):
-                try: return float(v) / 4.184
-                except: pass
-        return 0.0
-
-    n = dict(n or {})
-    if not n.get("Calories"):
-        n["Calories"] = _coerce_calories_from_usda(n)
-
-    if "Carbs" not in n:
-        for k in ["Carbohydrate, by difference", "Carbohydrate", "Carbohydrates"]:
-            if k in n:
-                try: n["Carbs"] = float(n[k] or 0)
-                except: n["Carbs"] = 0.0
-                break
-    if "Fat" not in n:
-        for k in ["Total lipid (fat)", "Total Fat"]:
-            if k in n:
-                try: n["Fat"] = float(n[k] or 0)
-                except: n["Fat"] = 0.0
-                break
-    if "Sat Fat" not in n:
-        for k in ["Fatty acids, total saturated", "Saturated Fat"]:
-            if k in n:
-                try: n["Sat Fat"] = float(n[k] or 0)
-                except: n["Sat Fat"] = 0.0
-                break
-    if "Mono Fat" not in n:
-        for k in ["Fatty acids, total monounsaturated"]:
-            if k in n:
-                try: n["Mono Fat"] = float(n[k] or 0)
-                except: n["Mono Fat"] = 0.0
-                break
-    if "Poly Fat" not in n:
-        for k in ["Fatty acids, total polyunsaturated"]:
-            if k in n:
-                try: n["Poly Fat"] = float(n[k] or 0)
-                except: n["Poly Fat"] = 0.0
-                break
-    if "Sugar" not in n:
-        for k in ["Sugars, total including NLEA", "Sugars, total", "Sugar"]:
-            if k in n:
-                try: n["Sugar"] = float(n[k] or 0)
-                except: n["Sugar"] = 0.0
-                break
-
-    maps = [
-        ("Sodium", "Sodium, Na"),
-        ("Potassium", "Potassium, K"),
-        ("Calcium", "Calcium, Ca"),
-        ("Magnesium", "Magnesium, Mg"),
-        ("Iron", "Iron, Fe"),
-        ("Phosphorus", "Phosphorus, P"),
-    ]
-    for std, alt in maps:
-        if std not in n and alt in n:
-            try: n[std] = float(n[alt] or 0)
-            except: n[std] = 0.0
+_TARGET_NAMES = tuple(TARGET_NUTRIENTS.values())
+
 
-    wanted = ["Sodium","Potassium","Phosphorus","Calcium","Magnesium",
-              "Protein","Carbs","Fat","Sat Fat","Mono Fat","Poly Fat",
-              "Sugar","Iron","Calories"]
-    for k in wanted:
-        try: n[k] = float(n.get(k, 0.0) or 0.0)
-        except: n[k] = 0.0
-    return n
+def _diary_by_food() -> dict:
+    """Return a live reference to session['diary_by_food'] ({date: {fdcId: entry}})."""
+    return session.setdefault("diary_by_food", {})
 
 
 def get_daymap(date_iso: str) -> dict:
-    di = session.setdefault("diary_by_food", {})
-    di.setdefault(date_iso, {})
-    return di[date_iso]
+    return _diary_by_food().setdefault(date_iso, {})
 
 
 def sum_nutrients_from_map(daymap: dict) -> dict:
@@ -117,13 +42,6 @@ def sum_nutrients_from_map(daymap: dict) -> dict:
     return totals
 
 
-def calc_progress(val, target):
-    if target <= 0: return 0, "bg-secondary"
-    pct = max(0, min(100, int(round(100 * float(val) / float(target)))))
-    cls = "bg-success" if pct <= 100 else "bg-danger"
-    return pct, cls
-
-
 def _build_totals_view(totals_raw: dict, targets: dict, prot_target: float, cal_target: float) -> dict:
     """Return a uniform totals dict for the template (bars, classes, targets)."""
     na = float(totals_raw.get("Sodium", 0.0))
@@ -308,17 +226,22 @@ def daily():
             qty_inputs = {}
             had_errors = False
 
-            for f in my_food_list:
-                fid = str(f.get("fdcId"))
+            # Only touch foods whose qty field was actually filled in
+            changed = {}
+            for key, val in request.form.items():
+                if key.startswith("qty_"):
+                    val = val.strip()
+                    if val:
+                        changed[key[4:]] = val
+            foods_by_id = {str(f.get("fdcId")): f for f in my_food_list} if changed else {}
+
+            for fid, raw in changed.items():
+                f = foods_by_id.get(fid)
+                if f is None:
+                    continue
                 desc = f.get("description", "(item)")
                 per100 = f.get("nutrients", {}) or {}
-
-                raw = (request.form.get(f"qty_{fid}") or "").strip()
-                if raw != "":
-                    qty_inputs[fid] = raw
-
-                if raw == "":
-                    continue
+                qty_inputs[fid] = raw
 
                 if raw.lower() in ("0", "clear", "none", "x"):
                     daymap.pop(fid, None)
@@ -346,7 +269,7 @@ def daily():
                 per100 = normalize_per100(per100)
                 scaled = {
                     name: round((per100.get(name, 0.0) * grams) / 100.0, 2)
-                    for name in TARGET_NUTRIENTS.values()
+                    for name in _TARGET_NAMES
                 }
                 if used_unit in ("g", "gram", "grams") or not used_unit:
                     portion_human = f"{grams:.0f} g"
@@ -407,21 +330,25 @@ def daily():
 
         if action == "copy_yesterday":
             ydate = (datetime.date.fromisoformat(date_iso) - datetime.timedelta(days=1)).isoformat()
-            ymap = session.get("diary_by_food", {}).get(ydate, {})
-            session["diary_by_food"][date_iso] = {k: dict(v) for k, v in ymap.items()}
+            diary = _diary_by_food()
+            ymap = diary.get(ydate, {})
+            diary[date_iso] = {k: dict(v) for k, v in ymap.items()}
             session.modified = True
             return redirect(url_for("daily.daily", date=date_iso))
 
         if action == "clear_day":
-            session["diary_by_food"][date_iso] = {}
+            _diary_by_food()[date_iso] = {}
             session.modified = True
             return redirect(url_for("daily.daily", date=date_iso))
 
         if action == "finalize_day":
+            import_session_history()  # move any legacy session["history"] into the file first
             totals = sum_nutrients_from_map(daymap)
-            history = session.setdefault("history", {})
-            history[date_iso] = {"entries": list(daymap.values()), "totals": totals}
-            session.modified = True
+            history_store.upsert_day(
+                current_app.instance_path,
+                session_user_id(),
+                {"date": date_iso, "totals": totals, "entries": list(daymap.values())},
+            )
             return redirect(url_for("reports.history"))
 
     totals_raw   = sum_nutrients_from_map(daymap)
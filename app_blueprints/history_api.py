@@ -3,6 +3,7 @@ from __future__ import annotations
 from flask import Blueprint, current_app, request, jsonify, render_template, Response
 from typing import Any, Dict, List
 from pathlib import Path
+from functools import lru_cache
 import csv
 import io
 
@@ -14,32 +15,34 @@ history_bp = Blueprint("history", __name__, url_prefix="/history")
 # ------------------------ User-id resolution ------------------------
 
 
+# Legacy ids that may still own a history file from earlier versions
+_LEGACY_IDS = ("demo", "demo@example.com", "user", "local", "default")
+
+
+# Path building only: this blueprint just reads history files, so nothing here
+# creates the directory (history_store creates it when it writes a file).
+@lru_cache(maxsize=4)
+def _history_dir_cached(instance_path: str) -> Path:
+    return Path(instance_path) / "history"
+
+
+@lru_cache(maxsize=64)
+def _file_for_cached(instance_path: str, user_id: str) -> Path:
+    safe = user_id.replace("/", "_").replace("\\", "_")
+    return _history_dir_cached(instance_path) / f"{safe}.json"
+
+
 def _history_dir() -> Path:
-    return Path(current_app.instance_path) / "history"
+    return _history_dir_cached(current_app.instance_path)
 
 
 def _file_for(user_id: str) -> Path:
-    safe = user_id.replace("/", "_").replace("\\", "_")
-    p = _history_dir()
-    p.mkdir(parents=True, exist_ok=True)
-    return p / f"{safe}.json"
+    return _file_for_cached(current_app.instance_path, user_id)
 
 
 def _candidate_ids() -> List[str]:
-    ids: List[str] = []
     cfg = current_app.config.get("HISTORY_USER_ID")
-    if cfg:
-        ids.append(str(cfg))
-    ids.extend(
-        [
-            "demo",
-            "demo@example.com",
-            "user",
-            "local",
-            "default",
-        ]
-    )
-    return ids
+    return [str(cfg), *_LEGACY_IDS] if cfg else list(_LEGACY_IDS)
 
 
 def _resolve_user_id() -> str:
@@ -2,10 +2,16 @@
 
 import os
 import json
+import pickle
+import threading
+from hashlib import blake2b
+from collections import OrderedDict
+from functools import lru_cache
 from flask import Blueprint, render_template, request, session, redirect, url_for, current_app
 
 # Reuse helpers from search
-from app_blueprints.search import normalize_per100, split_household
+from app_blueprints.search import UNIVER_HEADER, normalize_per100, split_household
+from nutrition.utils import parse_float, session_user_id, write_atomic
 
 label_bp = Blueprint("label_entry", __name__, url_prefix="/label")
 
@@ -28,11 +34,118 @@ CANONICAL_NUTRIENTS = [
 ]
 
 
+# The label-entry nutrients in label order (what the user types per serving)
+TYPED_NUTRIENTS = [
+    "Calories",
+    "Fat",
+    "Sat Fat",
+    "Cholesterol",
+    "Sodium",
+    "Carbs",
+    "Sugar",
+    "Protein",
+    "Calcium",
+    "Iron",
+    "Potassium",
+]
+
+
+@lru_cache(maxsize=None)
 def _field_name_for(n: str) -> str:
     # Turn "Sat Fat" -> "nut_Sat_Fat" for HTML input names
     return "nut_" + n.replace(" ", "_")
 
 
+def _univer_row(f: dict):
+    """
+    Build one foods_table.json row (per-serving values) for a my_food_list item.
+    Returns None for rows with no nutrient data.
+    """
+    # Prefer per-serving nutrients if available
+    comp = f.get("computed") or {}
+    per_serving = comp.get("portion_nutrients")
+
+    if not per_serving:
+        # Fallback: derive something reasonable from nutrients
+        per_serving = normalize_per100(f.get("nutrients", {}))
+
+    # Serving info
+    ss = f.get("servingSize") or 0
+    ssu = f.get("servingSizeUnit") or "g"
+
+    # Household label -> numeric amount + text (e.g. "2/3 cup")
+    household_text = f.get("householdServingFullText") or ""
+    label_units_str, unit_type = split_household(household_text)
+
+    # For now keep the numeric value as float (we can pretty-print later)
+    label_units = parse_float(label_units_str, "")
+
+    row = [
+        (f.get("description") or "").strip() or "(manual label)",  # Food name
+        ss,
+        ssu,
+        label_units,
+        unit_type,
+    ]
+
+    # Append nutrients in canonical order (PER SERVING)
+    for key in CANONICAL_NUTRIENTS:
+        row.append(per_serving.get(key, 0.0))
+
+    # Skip totally empty rows (no description and all zeros)
+    has_nutrients = any(v not in (0, 0.0, "", None) for v in row[5:])
+    return row if has_nutrients else None
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _list_digest(foods: list) -> bytes:
+    # Content snapshot of a food list: the dicts themselves are mutated in place
+    # elsewhere, so keeping references would hide edits
+    return blake2b(pickle.dumps(foods, pickle.HIGHEST_PROTOCOL), digest_size=16).digest()
+
+
+# user id -> (digest of the my_food_list the table was last built from, its
+# encoded rows without the closing "]}"); least recently used users are evicted
+# past the cap. Shared by all request threads, so every access holds the lock.
+_TABLE_BY_USER = OrderedDict()
+_TABLE_BY_USER_MAX = 64
+_TABLE_LOCK = threading.Lock()
+
+
+def _table_payload(uid: str, my_food_list: list) -> str:
+    """
+    foods_table.json text for my_food_list, identical to encoding the rebuilt
+    {"rows": [UNIVER_HEADER, *rows]}. When the cached list matches my_food_list
+    minus its new last entry, only that entry's row is encoded and appended;
+    any other change to the list (removed, edited, reordered foods) rebuilds.
+    """
+    with _TABLE_LOCK:
+        cached = _TABLE_BY_USER.get(uid)
+
+    if cached is not None and my_food_list and cached[0] == _list_digest(my_food_list[:-1]):
+        body = cached[1]
+        row = _univer_row(my_food_list[-1])
+        if row is not None:
+            body += "," + _dumps(row)
+    else:
+        parts = [_dumps(UNIVER_HEADER)]
+        for f in my_food_list:
+            row = _univer_row(f)
+            if row is not None:
+                parts.append(_dumps(row))
+        body = ",".join(parts)
+
+    with _TABLE_LOCK:
+        _TABLE_BY_USER[uid] = (_list_digest(my_food_list), body)
+        _TABLE_BY_USER.move_to_end(uid)
+        while len(_TABLE_BY_USER) > _TABLE_BY_USER_MAX:
+            _TABLE_BY_USER.popitem(last=False)
+    return '{"rows":[' + body + "]}"
+
+
 @label_bp.route("/", methods=["GET", "POST"])
 def index():
     """
@@ -42,8 +155,8 @@ def index():
     - Internally we still compute per-100g for other parts of the app,
       but **Univer now always uses per-serving** values.
     - We append a new entry into session['my_food_list'] (for USDA page).
-    - We rebuild instance/univer/foods_table.json from the master list
-      using per-serving values (portion_nutrients).
+    - We rebuild instance/univer/foods_table.json from the master list using
+      per-serving values (portion_nutrients).
     """
     my_food_list = session.get("my_food_list", [])
 
@@ -56,28 +169,28 @@ def index():
 
         # Serving size in grams (you’re entering grams directly on the page)
         serving_size_raw = request.form.get("serving_size") or ""
-        try:
-            grams_per_serving = float(serving_size_raw) if serving_size_raw not in ("", None) else 0.0
-        except Exception:
-            grams_per_serving = 0.0
+        grams_per_serving = parse_float(serving_size_raw)
 
         if grams_per_serving <= 0:
             grams_per_serving = 100.0  # last-resort fallback
 
         serving_unit = "g"
 
-        # --- Internal per-100g nutrients (for consistency with existing code) ---
-        per100 = {}
-        for name in CANONICAL_NUTRIENTS:
-            field_name = _field_name_for(name)
-            raw = request.form.get(field_name, "")
-            try:
-                per_serving_val = float(raw) if raw not in ("", None) else 0.0
-            except Exception:
-                per_serving_val = 0.0
+        # Read every per-serving value once (TYPED_NUTRIENTS ⊆ CANONICAL_NUTRIENTS)
+        form = request.form
+        per_serving_vals = {
+            name: parse_float(form.get(_field_name_for(name), ""))
+            for name in CANONICAL_NUTRIENTS
+        }
 
+        # --- Internal per-100g nutrients (for consistency with existing code) ---
+        # grams_per_serving is always > 0 here (fallback above), so scale by one factor
+        scale = 100.0 / grams_per_serving
+        per100 = {
             # Keep internal semantics: per-100g
-            per100[name] = round(per_serving_val * 100.0 / grams_per_serving, 4) if grams_per_serving > 0 else 0.0
+            name: round(val * scale, 4)
+            for name, val in per_serving_vals.items()
+        }
 
         # Build the entry in the same shape as USDA entries
         new_entry = {
@@ -95,29 +208,7 @@ def index():
         }
 
         # Portion nutrients = exactly what you typed per serving
-        portion_nutrients = {}
-        # These are the label-entry nutrients in label order
-        typed_names = [
-            "Calories",
-            "Fat",
-            "Sat Fat",
-            "Cholesterol",
-            "Sodium",
-            "Carbs",
-            "Sugar",
-            "Protein",
-            "Calcium",
-            "Iron",
-            "Potassium",
-        ]
-        for name in typed_names:
-            field_name = _field_name_for(name)
-            raw = request.form.get(field_name, "")
-            try:
-                val = float(raw) if raw not in ("", None) else 0.0
-            except Exception:
-                val = 0.0
-            portion_nutrients[name] = round(val, 2)
+        portion_nutrients = {name: round(per_serving_vals[name], 2) for name in TYPED_NUTRIENTS}
 
         new_entry["computed"] = {
             "portion_grams": round(grams_per_serving, 2),
@@ -130,95 +221,16 @@ def index():
         session.modified = True
 
         # --------- REBUILD Univer foods_table.json USING PER-SERVING VALUES ---------
-        # Header row must match HEAD2_COLUMNS from Univer main.js
-        header = [
-            "Food",
-            "Serving Size",
-            "Serving Unit",
-            "Label Units",
-            "Unit Type",
-            "Sodium (mg)",
-            "Potassium (mg)",
-            "Protein (g)",
-            "Calories",
-            "Cholesterol (mg)",
-            "Carbs (g)",
-            "Fat (g)",
-            "Sat Fat (g)",
-            "Mono Fat (g)",
-            "Poly Fat (g)",
-            "Sugar (g)",
-            "Calcium (mg)",
-            "Magnesium (mg)",
-            "Iron (mg)",
-        ]
-
-        nutrient_order = [
-            "Sodium",
-            "Potassium",
-            "Protein",
-            "Calories",
-            "Cholesterol",
-            "Carbs",
-            "Fat",
-            "Sat Fat",
-            "Mono Fat",
-            "Poly Fat",
-            "Sugar",
-            "Calcium",
-            "Magnesium",
-            "Iron",
-        ]
-
-        rows = [header]
-
-        for f in my_food_list:
-            # Prefer per-serving nutrients if available
-            comp = f.get("computed") or {}
-            per_serving = comp.get("portion_nutrients")
-
-            if not per_serving:
-                # Fallback: derive something reasonable from nutrients
-                per_serving = normalize_per100(f.get("nutrients", {}))
-
-            # Serving info
-            ss = f.get("servingSize") or 0
-            ssu = f.get("servingSizeUnit") or "g"
-
-            # Household label -> numeric amount + text (e.g. "2/3 cup")
-            household_text = f.get("householdServingFullText") or ""
-            label_units_str, unit_type = split_household(household_text)
-
-            # For now keep the numeric value as float (we can pretty-print later)
-            try:
-                label_units = float(label_units_str) if label_units_str else ""
-            except Exception:
-                label_units = ""
-
-            row = [
-                (f.get("description") or "").strip() or "(manual label)",  # Food name
-                ss,
-                ssu,
-                label_units,
-                unit_type,
-            ]
-
-            # Append nutrients in canonical order (PER SERVING)
-            for key in nutrient_order:
-                row.append(per_serving.get(key, 0.0))
-
-            # Skip totally empty rows (no description and all zeros)
-            has_nutrients = any(v not in (0, 0.0, "", None) for v in row[5:])
-            if has_nutrients:
-                rows.append(row)
-
         base = current_app.instance_path
         univer_dir = os.path.join(base, "univer")
         os.makedirs(univer_dir, exist_ok=True)
         json_path = os.path.join(univer_dir, "foods_table.json")
 
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump({"rows": rows}, f, ensure_ascii=False)
+        # Rows for the whole master list (so removed foods drop out of the table),
+        # encoding only the new row when the rest is unchanged since the last add
+        payload = _table_payload(session_user_id(), my_food_list)
+        # One atomic write (never leave a half-written table)
+        write_atomic(json_path, payload.encode("utf-8"))
 
         # After saving, go straight to the Univer sheet
         return redirect(url_for("univer.univer_foods"))
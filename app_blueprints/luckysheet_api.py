@@ -1,6 +1,13 @@
 # app_blueprints/luckysheet_api.py
-from flask import Blueprint, current_app, jsonify, request, session, make_response
-import os, json
+from flask import Blueprint, current_app, jsonify, request, session, make_response, g
+import os, json, hashlib
+
+from nutrition.utils import write_atomic
+
+try:
+    import orjson  # much faster encode/decode for large workbooks
+except ImportError:
+    orjson = None
 
 bp = Blueprint("luckysheet_api", __name__, url_prefix="/api")
 
@@ -9,6 +16,9 @@ bp = Blueprint("luckysheet_api", __name__, url_prefix="/api")
 # Enforce: freeze top 3 rows (0,1,2) and 1 left column (A)
 # How many rows/columns you want frozen:
 FROZEN = {"type": "both", "range": [3, 1]}  # top 3 rows, 1 left column
+# FROZEN / MERGES / COLUMNLEN are shared by reference into every sheet rather than
+# copied per call; nothing mutates them in place. (MappingProxyType would be safer
+# but neither json nor orjson can serialize it.)
 
 def _enforce_frozen_on_sheet(sheet: dict) -> None:
     """
@@ -19,11 +29,11 @@ def _enforce_frozen_on_sheet(sheet: dict) -> None:
         return
 
     # Top-level `frozen` (some Luckysheet code paths still look here)
-    sheet["frozen"] = dict(FROZEN)
+    sheet["frozen"] = FROZEN
 
     # config.freezen is what the drag-bar and UI logic use
     cfg = sheet.setdefault("config", {})
-    cfg["freezen"] = dict(FROZEN)
+    cfg["freezen"] = FROZEN
 
 
 # Row 2 labels (HEAD2) that the rest of the app expects
@@ -60,6 +70,43 @@ COLUMNLEN = {i: w for i, w in enumerate(COL_WIDTHS)}
 
 # --- Utilities ---------------------------------------------------------------
 
+def _dumps(obj) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes (orjson when available)."""
+    if orjson is not None:
+        # COLUMNLEN and friends use int keys
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# path -> (BLAKE2b digest, mtime_ns, size) of the file we last wrote there
+# (autosave often resends identical data)
+_LAST_SAVED_DIGEST = {}
+
+def _write_if_changed(path, data: bytes) -> bool:
+    """
+    Atomically write `data` unless it matches what we last wrote to `path` and the
+    file is still that write (same mtime and size). Returns True if written.
+    """
+    key = str(path)
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    last = _LAST_SAVED_DIGEST.get(key)
+    if last is not None and last[0] == digest:
+        try:
+            st = os.stat(key)
+        except OSError:
+            st = None
+        if st is not None and (st.st_mtime_ns, st.st_size) == last[1:]:
+            return False
+    write_atomic(key, data)
+    st = os.stat(key)
+    _LAST_SAVED_DIGEST[key] = (digest, st.st_mtime_ns, st.st_size)
+    return True
+
+def _loads(raw):
+    """Parse JSON from bytes/str (orjson when available)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 def _user_wb_dir():
     d = os.path.join(current_app.instance_path, "luckysheet")
     os.makedirs(d, exist_ok=True)
@@ -77,40 +124,6 @@ def _to_lucky_rows(rows_2d):
     """Wrap plain values into Luckysheet cell dicts: {'v': value} or None."""
     return [[(None if v is None else {"v": v}) for v in row] for row in rows_2d]
 
-def _from_lucky_rows(ls_rows):
-    """Extract plain values from Luckysheet sheet['data'] array-of-arrays."""
-    return [[(c.get("v") if isinstance(c, dict) else (None if c is None else c))
-             for c in (row or [])] for row in (ls_rows or [])]
-
-def _sheet_to_grid(sheet: dict):
-    """
-    Convert a Luckysheet sheet (either 'data' or 'celldata' style) to plain 2-D list.
-    """
-    if isinstance(sheet.get("data"), list) and sheet["data"]:
-        return _from_lucky_rows(sheet["data"])
-
-    grid = []
-    for cell in sheet.get("celldata", []):
-        r, c = cell["r"], cell["c"]
-        v = cell["v"]
-        v = v.get("v") if isinstance(v, dict) and "v" in v else v
-        while len(grid) <= r:
-            grid.append([])
-        while len(grid[r]) <= c:
-            grid[r].append(None)
-        grid[r][c] = v
-    return grid
-
-def _grid_to_celldata(grid):
-    """Convert plain 2-D list into Luckysheet 'celldata' array."""
-    cells = []
-    for r, row in enumerate(grid):
-        for c, v in enumerate(row or []):
-            if v is None:
-                continue
-            cells.append({"r": r, "c": c, "v": {"v": v}})
-    return cells
-
 # --- Seeding & Normalization -------------------------------------------------
 
 def _seed_sheet():
@@ -127,11 +140,11 @@ def _seed_sheet():
         "name": "Foods", "index": 0, "order": 0, "status": 1,
         "data": _to_lucky_rows(seed_rows),
         "config": {
-            "merge": MERGES.copy(),
+            "merge": MERGES,
             "rowlen": {"0": 28, "1": 28, "2": 8},
-            "columnlen": COLUMNLEN.copy(),
+            "columnlen": COLUMNLEN,
         },
-        "frozen": FROZEN.copy(),
+        "frozen": FROZEN,
     }
     return sheet
 
@@ -159,7 +172,7 @@ def _ensure_three_seed_rows(sheet: dict):
         rows += 1
 
     # Ensure frozen present & correct
-    sheet["frozen"] = FROZEN.copy()
+    sheet["frozen"] = FROZEN
 
     # Ensure config with rowlen & columnlen is present
     cfg = sheet.setdefault("config", {})
@@ -167,8 +180,10 @@ def _ensure_three_seed_rows(sheet: dict):
     rowlen["0"] = rowlen.get("0", 28)
     rowlen["1"] = rowlen.get("1", 28)
     rowlen["2"] = rowlen.get("2", 8)
-    cfg.setdefault("merge", MERGES.copy())
-    cfg.setdefault("columnlen", COLUMNLEN.copy())
+    if "merge" not in cfg:
+        cfg["merge"] = MERGES
+    if "columnlen" not in cfg:
+        cfg["columnlen"] = COLUMNLEN
 
 def _normalize_wb(wb: dict):
     """
@@ -206,21 +221,33 @@ def _safe_load():
     Also normalize legacy shapes (e.g., wrong frozen spec).
     """
     p = _user_wb_path()
+    # Reuse the workbook parsed earlier in this request (e.g. repeated append_rows calls)
+    cached = g.get("luckysheet_wb")
+    if cached is not None and cached[0] == p:
+        return cached[1]
+    wb = None
     try:
         if os.path.exists(p):
-            with open(p, "r", encoding="utf-8") as f:
-                wb = json.load(f)
-            return _normalize_wb(wb)
+            with open(p, "rb") as f:
+                wb = _normalize_wb(_loads(f.read()))
     except Exception:
-        pass
-    return _empty_workbook()
+        wb = None
+    if wb is None:
+        wb = _empty_workbook()
+    g.luckysheet_wb = (p, wb)
+    return wb
 
-def _save_wb(wb: dict):
-    """Persist workbook after normalizing structure and frozen."""
-    wb = _normalize_wb(wb)
+def _save_wb(wb: dict, normalized: bool = False):
+    """
+    Persist workbook after normalizing structure and frozen.
+    Pass normalized=True when `wb` came from _safe_load()/_empty_workbook()
+    and has only had rows appended, to skip the second normalize pass.
+    """
+    if not normalized:
+        wb = _normalize_wb(wb)
     p = _user_wb_path()
-    with open(p, "w", encoding="utf-8") as f:
-        json.dump(wb, f, ensure_ascii=False)
+    _write_if_changed(p, _dumps(wb))
+    g.luckysheet_wb = (p, wb)
 
 # --- Public helpers used by other modules -----------------------------------
 
@@ -231,22 +258,20 @@ def append_rows(rows):
     """
     wb = _safe_load()
     sheet = wb["data"][0]
-    data_grid = _sheet_to_grid(sheet)
+    sheet_data = sheet.get("data")
 
     # Ensure we have headers + spacer exactly once
-    if len(data_grid) < 2:
-        seeded = _sheet_to_grid(_seed_sheet())
-        data_grid = seeded
+    if not isinstance(sheet_data, list) or len(sheet_data) < 2:
+        sheet_data = sheet["data"] = _seed_sheet()["data"]
 
-    # Append rows, normalized to HEAD2 width
+    # Append rows in place, normalized to HEAD2 width; existing cells are already wrapped
+    width = len(HEAD2)
+    append = sheet_data.append
     for r in rows or []:
-        arr = list(r[:len(HEAD2)]) + [None] * max(0, len(HEAD2) - len(r))
-        data_grid.append(arr)
+        arr = list(r[:width]) + [None] * max(0, width - len(r))
+        append([(None if v is None else {"v": v}) for v in arr])
 
-    # Write back and save
-    sheet["data"] = _to_lucky_rows(data_grid)
-    sheet["frozen"] = FROZEN.copy()
-    _save_wb(wb)
+    _save_wb(wb, normalized=True)  # _safe_load already normalized; appending rows keeps it valid
     return {"ok": True, "added": len(rows or [])}
 
 def append_rows_direct(rows):
@@ -262,7 +287,6 @@ def api_luckysheet_get():
     on every sheet before sending it to the browser.
     """
     from pathlib import Path
-    import json
     from flask import current_app, jsonify
 
     # Adjust this to however you currently locate your luckysheet JSON file
@@ -277,8 +301,8 @@ def api_luckysheet_get():
             _enforce_frozen_on_sheet(sh)
         return jsonify({"data": data})
 
-    raw_text = f.read_text(encoding="utf-8")
-    wb = json.loads(raw_text) if raw_text.strip() else {}
+    raw = f.read_bytes()
+    wb = _loads(raw) if raw.strip() else {}
 
     # Workbooks can be either:
     #  - {"data": [sheet, sheet, ...]} (typical Luckysheet)
@@ -299,7 +323,6 @@ def api_luckysheet_post():
     first so future loads are consistent.
     """
     from pathlib import Path
-    import json
     from flask import current_app, request, jsonify
 
     payload = request.get_json(silent=True) or {}
@@ -316,7 +339,7 @@ def api_luckysheet_post():
     f = inst / "luckysheet" / "anon.json"  # adjust to match GET
 
     f.parent.mkdir(parents=True, exist_ok=True)
-    f.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    _write_if_changed(f, _dumps(payload))
 
     return jsonify({"ok": True})
 
@@ -332,5 +355,5 @@ def api_luckysheet_reset():
     Server-owned reset: throw away the current workbook and seed a fresh one.
     This guarantees headers + frozen are in the shape Daily & USDA expect.
     """
-    _save_wb(_empty_workbook())
+    _save_wb(_empty_workbook(), normalized=True)
     return jsonify({"ok": True})
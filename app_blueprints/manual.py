@@ -1,7 +1,9 @@
 # app_blueprints/manual.py
+import inspect
 from flask import Blueprint, render_template, request, redirect, url_for, session
 from nutrition.constants import LABEL_TO_NAME  # maps label text → canonical names
 from nutrition.services.nutrients import normalize_per100  # already in your services
+from nutrition.utils import parse_float
 
 # --- Portion parsing: function + portions map (robust imports with fallback) ---
 PORTION_DB = {}  # default, will be replaced by real mapping if available
@@ -35,68 +37,93 @@ if not PORTION_DB:
         "serving": 0.0, "servings": 0.0,        # treat as unknown unless specified
     }
 
+def _bind_grams_fn(fn):
+    """
+    Pick grams_from_qty_text's call shape once at import, in the order submit()
+    used to probe per POST with try/except TypeError: (text, PORTION_DB), then
+    (text). Returns None when neither shape fits, e.g. quantity_parser's
+    (name, text, portions); the serving text is then not parsed, as before.
+    """
+    try:
+        sig = inspect.signature(fn)
+    except (TypeError, ValueError):  # no introspectable signature: use the first shape
+        return lambda text: fn(text, PORTION_DB)
+    try:
+        sig.bind("", PORTION_DB)
+        return lambda text: fn(text, PORTION_DB)
+    except TypeError:
+        pass
+    try:
+        sig.bind("")
+        return fn
+    except TypeError:
+        return None
+
+_GRAMS_FN = _bind_grams_fn(grams_from_qty_text)
+
+
 manual_bp = Blueprint("manual", __name__)
 
-def _empty_label():
-    # keys you care about; extend as needed
-    return {
-        "name": "",
-        "brand": "",
-        "serving_amount": "",     # e.g. "2/3 cup" or "1 slice" or "40 g"
-        "serving_grams": "",      # explicit grams, if known (overrides parsing)
-        "servings_per_container": "",
-        "Calories": "",
-        "Protein": "",
-        "Carbs": "",
-        "Fat": "",
-        "Sat Fat": "",
-        "Mono Fat": "",
-        "Poly Fat": "",
-        "Sugar": "",
-        "Sodium": "",
-        "Potassium": "",
-        "Calcium": "",
-        "Magnesium": "",
-        "Iron": "",
-        # add Phosphorus etc. if you track them
-    }
+# Label nutrients we scale to per-100 g (resolved once from LABEL_TO_NAME)
+_SCALED_NUTRIENTS = tuple(
+    name for name in LABEL_TO_NAME.values()
+    if name in (
+        "Protein","Carbs","Fat","Sat Fat","Mono Fat","Poly Fat","Sugar",
+        "Sodium","Potassium","Calcium","Magnesium","Iron","Calories"
+    )
+)
+
+# Blank form; built once at import and copied per request.
+# keys you care about; extend as needed
+_EMPTY_LABEL = {
+    "name": "",
+    "brand": "",
+    "serving_amount": "",     # e.g. "2/3 cup" or "1 slice" or "40 g"
+    "serving_grams": "",      # explicit grams, if known (overrides parsing)
+    "servings_per_container": "",
+    "Calories": "",
+    "Protein": "",
+    "Carbs": "",
+    "Fat": "",
+    "Sat Fat": "",
+    "Mono Fat": "",
+    "Poly Fat": "",
+    "Sugar": "",
+    "Sodium": "",
+    "Potassium": "",
+    "Calcium": "",
+    "Magnesium": "",
+    "Iron": "",
+    # add Phosphorus etc. if you track them
+}
 
 @manual_bp.route("/manual", methods=["GET"], endpoint="form")
 def form():
-    data = session.get("manual_form_last", _empty_label())
+    data = session.get("manual_form_last")
+    if data is None:
+        data = dict(_EMPTY_LABEL)
     return render_template("manual_entry.html", data=data)
 
 @manual_bp.route("/manual", methods=["POST"], endpoint="submit")
 def submit():
     # 1) collect posted fields
-    fields = _empty_label()
-    for k in fields.keys():
-        fields[k] = (request.form.get(k) or "").strip()
+    form_get = request.form.get
+    fields = {k: (form_get(k) or "").strip() for k in _EMPTY_LABEL}
 
-    session["manual_form_last"] = fields  # convenience
+    if session.get("manual_form_last") != fields:
+        session["manual_form_last"] = fields  # convenience; skip the write on a resubmit
 
     # 2) derive serving grams
     serving_grams = 0.0
 
     # (a) explicit grams wins, if provided
     if fields["serving_grams"]:
-        try:
-            serving_grams = float(fields["serving_grams"])
-        except ValueError:
-            serving_grams = 0.0
+        serving_grams = parse_float(fields["serving_grams"])
 
     # (b) else parse free text like “2/3 cup”, “1 slice”, “40 g”, etc.
-    if serving_grams <= 0.0 and fields["serving_amount"]:
-        serving_text = fields["serving_amount"].strip()
+    if serving_grams <= 0.0 and fields["serving_amount"] and _GRAMS_FN is not None:
         try:
-            # Most implementations use: grams_from_qty_text(text, portions)
-            serving_grams = float(grams_from_qty_text(serving_text, PORTION_DB) or 0.0)
-        except TypeError:
-            # If your function only accepts one arg (legacy), fall back
-            try:
-                serving_grams = float(grams_from_qty_text(serving_text) or 0.0)  # type: ignore
-            except Exception:
-                serving_grams = 0.0
+            serving_grams = float(_GRAMS_FN(fields["serving_amount"].strip()) or 0.0)
         except Exception:
             serving_grams = 0.0
 
@@ -105,18 +132,10 @@ def submit():
     factor = (100.0 / serving_grams) if serving_grams > 0 else 1.0
 
     # 3) build a USDA-like detail (enough for your downstream code)
-    per100 = {}
-    for label_key, canonical_name in LABEL_TO_NAME.items():
-        if canonical_name in (
-            "Protein","Carbs","Fat","Sat Fat","Mono Fat","Poly Fat","Sugar",
-            "Sodium","Potassium","Calcium","Magnesium","Iron","Calories"
-        ):
-            raw = fields.get(canonical_name, "")
-            try:
-                val = float(raw) if raw else 0.0
-            except Exception:
-                val = 0.0
-            per100[canonical_name] = round(val * factor, 6)
+    per100 = {
+        name: round(parse_float(fields.get(name, "")) * factor, 6)
+        for name in _SCALED_NUTRIENTS
+    }
 
     # 4) construct a “custom food” entry similar to USDA search result
     custom_id = f"custom:{(fields['name'] or 'Manual Food').strip()}".replace(" ", "_")
@@ -1,63 +1,76 @@
 # app_blueprints/recipes.py
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from flask import Blueprint, render_template, request, session, redirect, url_for
 from nutrition.constants import TARGET_NUTRIENTS
 from nutrition.services.usda_client import (
-    get_food_detail, search_top_for_recipes, search_best_fdc_for_recipes
+    get_food_detail, get_food_details_bulk, search_top_for_recipes, search_best_fdc_for_recipes
 )
 from nutrition.services.portions import (
     recipe_portions, derive_common_volumes_simple, portion_match_from_labels,
     find_wiftee_portions_for_name, find_alt_portions_for_name
 )
 from nutrition.services.units import grams_from_local_registry, parse_line_to_qty_unit_name
+from nutrition.services.nutrients import recipe_per100_from_detail
 
 recipes_bp = Blueprint("recipes", __name__)
 
-# --- helper copied from app.py to avoid circular imports ---
-def recipe_per100_from_detail(detail: dict) -> dict:
-    per100 = {name: 0.0 for name in TARGET_NUTRIENTS.values()}
-
-    # Preferred: foodNutrients
-    fn = detail.get("foodNutrients")
-    if fn:
-        for nut in fn:
-            nutrient = (nut.get("nutrient") or {})
-            nid = nutrient.get("id") or nut.get("nutrientId")
-            number = nutrient.get("number")
-            name = (nutrient.get("name") or "").lower()
-            amt = nut.get("amount") or nut.get("value")
-            if not isinstance(amt, (int, float)):
-                continue
-            if nid in TARGET_NUTRIENTS:
-                per100[TARGET_NUTRIENTS[nid]] = float(amt)
-            elif number == "208" or "energy" in name:
-                per100["Calories"] = float(amt)
-        return per100
-
-    # Fallback: labelNutrients scaled by servingSize (grams)
-    ln = detail.get("labelNutrients")
-    serving = detail.get("servingSize")
-    unit = (detail.get("servingSizeUnit") or "").lower()
-    if ln and isinstance(serving, (int, float)) and unit in ("g", "gram", "grams"):
-        mapping = {
-            "protein": "Protein",
-            "carbohydrates": "Carbs",
-            "fat": "Fat",
-            "saturatedFat": "Sat Fat",
-            "monounsaturatedFat": "Mono Fat",
-            "polyunsaturatedFat": "Poly Fat",
-            "sugars": "Sugar",
-            "calcium": "Calcium",
-            "iron": "Iron",
-            "calories": "Calories",
-            "sodium": "Sodium",
-        }
-        factor = 100.0 / float(serving)
-        for k, col in mapping.items():
-            v = (ln.get(k) or {}).get("value")
-            if isinstance(v, (int, float)):
-                per100[col] = float(v) * factor
-    return per100
-# -----------------------------------------------------------
+# Fixed nutrient order for packed recipe items
+_NAMES = tuple(TARGET_NUTRIENTS.values())
+_ZERO_NUTR = dict.fromkeys(_NAMES, 0.0)
+_get_all = itemgetter(*_NAMES)
+
+def _pack(name: str, grams: float, per100: dict) -> list:
+    """Session form of a recipe item: [name, grams, [per100 in _NAMES order]]."""
+    return [name, grams, [per100.get(n, 0.0) for n in _NAMES]]
+
+def _scale(vec, grams: float) -> list:
+    """Per-100 g vector -> amounts for `grams`, rounded to 4 places (the one scaling site)."""
+    f = grams / 100.0
+    return [round(v * f, 4) for v in vec]
+
+def _item_view(row) -> dict:
+    """Expand a packed item to {name, grams, per100, scaled} for totals and the template."""
+    if isinstance(row, dict):  # item stored before packing; fill any missing nutrients
+        per100 = row.get("per100") or {}
+        return dict(row, per100={n: per100.get(n, 0.0) for n in _NAMES})
+    name, grams, vec = row
+    return {
+        "name": name,
+        "grams": grams,
+        "per100": dict(zip(_NAMES, vec)),
+        "scaled": dict(zip(_NAMES, _scale(vec, grams))),
+    }
+
+# fdcId -> (detail, per100, portions); repeated bulk-add foods skip the fetch and re-parse
+_PARSED = {}
+_PARSED_MAX = 512
+
+def _parsed_details(fdcs):
+    """
+    {fdcId: (detail, per100, portions)} for the ids in `fdcs` that resolve.
+    Uncached ids go out in one bulk /foods call; anything it misses is fetched singly.
+    """
+    wanted = [f for f in dict.fromkeys(fdcs) if f]
+    need = [f for f in wanted if f not in _PARSED]
+    if not need:
+        return {f: v for f in wanted if (v := _PARSED.get(f))}
+    fetched = get_food_details_bulk(need)
+    missing = [f for f in need if not fetched.get(f)]
+    for f, det in zip(missing, _FETCH_POOL.map(get_food_detail, missing)):
+        fetched[f] = det
+    out = {f: v for f in wanted if (v := _PARSED.get(f))}
+    if len(_PARSED) + len(need) > _PARSED_MAX:
+        _PARSED.clear()
+    for f in need:
+        det = fetched.get(f)
+        if det:
+            out[f] = _PARSED[f] = (det, recipe_per100_from_detail(det),
+                                   tuple(derive_common_volumes_simple(recipe_portions(det))))
+    return out
+
+# Shared across requests so bulk add doesn't pay thread start-up each time
+_FETCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="recipes-usda")
 
 @recipes_bp.route("/recipes", methods=["GET", "POST"], endpoint="recipes")
 def recipes():
@@ -65,7 +78,7 @@ def recipes():
     session.setdefault("recipe_picker", {})
     items = session["recipe_items"]
     picker = session["recipe_picker"]
-    names = list(TARGET_NUTRIENTS.values())
+    names = _NAMES
 
     search_hits = []
     picked_detail = None
@@ -117,10 +130,8 @@ def recipes():
             per100 = picker.get("per100") or {}
             desc = (picker.get("detail") or {}).get("description") or "(item)"
             if g > 0 and per100:
-                scaled = {n: round(per100.get(n, 0.0) * g / 100.0, 4) for n in names}
-                items.append({"name": desc, "grams": g, "per100": per100, "scaled": scaled})
+                items.append(_pack(desc, g, per100))
                 session["recipe_picker"] = {}
-                session.modified = True
                 return redirect(url_for("recipes.recipes"))
 
         # ---------- step 3b: add by portion ----------
@@ -138,12 +149,8 @@ def recipes():
                 p = next((o for o in portions if o["id"] == sel), None)
                 if p:
                     grams = p["gramWeight"] * qty
-                    scaled = {n: round(per100.get(n, 0.0) * grams / 100.0, 4) for n in names}
-                    items.append(
-                        {"name": f"{desc} – {qty}× {p['label']}", "grams": grams, "per100": per100, "scaled": scaled}
-                    )
+                    items.append(_pack(f"{desc} – {qty}× {p['label']}", grams, per100))
                     session["recipe_picker"] = {}
-                    session.modified = True
                     return redirect(url_for("recipes.recipes"))
 
         # ---------- step 3c: add by free unit ----------
@@ -169,38 +176,35 @@ def recipes():
                     grams = grams_from_local_registry(desc, unit, qty)
 
             if grams > 0:
-                scaled = {n: round(per100.get(n, 0.0) * grams / 100.0, 4) for n in names}
-                items.append(
-                    {"name": f"{desc} – {qty}× {unit}", "grams": grams, "per100": per100, "scaled": scaled}
-                )
+                items.append(_pack(f"{desc} – {qty}× {unit}", grams, per100))
                 session["recipe_picker"] = {}
-                session.modified = True
                 return redirect(url_for("recipes.recipes"))
             else:
                 session["recipe_notice"] = (
                     f"No conversion for unit '{unit}' with item '{desc}'. "
                     f"Try 'cup', 'tbsp', 'tsp', 'whole', or add a mapping."
                 )
-                session.modified = True
                 return redirect(url_for("recipes.recipes"))
 
         # ---------- bulk add ----------
         elif action == "bulk_add":
             raw = (request.form.get("bulk_text") or "").splitlines()
+            parsed = []
             for line in raw:
-                qty, unit, name = parse_line_to_qty_unit_name(line)
-                if not name or not qty:
+                if not line.strip():
                     continue
-
-                fdc = search_best_fdc_for_recipes(name)
-                if not fdc:
-                    continue
-                det = get_food_detail(fdc)
-                if not det:
+                qty, unit, name = parse_line_to_qty_unit_name(line)
+                if name and qty:
+                    parsed.append((line, qty, unit, name))
+
+            # USDA lookups are blocking HTTP: overlap the name searches, then fetch all
+            # details in one bulk call; the accounting below runs here, in input order
+            fdcs = list(_FETCH_POOL.map(search_best_fdc_for_recipes, [p[3] for p in parsed]))
+            details = _parsed_details(fdcs)
+            for (line, qty, unit, name), fdc in zip(parsed, fdcs):
+                if fdc not in details:
                     continue
-
-                per100 = recipe_per100_from_detail(det)
-                portions = derive_common_volumes_simple(recipe_portions(det))
+                det, per100, portions = details[fdc]
 
                 grams = 0.0
                 if unit and portions:
@@ -219,33 +223,28 @@ def recipes():
 
                 if grams <= 0:
                     session["recipe_notice"] = f"Could not convert '{line.strip()}'."
-                    session.modified = True
                     continue
 
                 desc = det.get("description") or name
-                scaled = {n: round(per100.get(n, 0.0) * grams / 100.0, 4) for n in names}
-                items.append({"name": f"{desc} – {line.strip()}", "grams": grams, "per100": per100, "scaled": scaled})
+                items.append(_pack(f"{desc} – {line.strip()}", grams, per100))
 
             session["recipe_picker"] = {}
-            session.modified = True
             return redirect(url_for("recipes.recipes"))
 
         # ---------- remove / clear / picker clear ----------
         elif action == "remove":
-            idxs = {int(x) for x in request.form.getlist("remove_index") if x.isdigit()}
-            session["recipe_items"] = [it for i, it in enumerate(items) if i not in idxs]
-            items = session["recipe_items"]
-            session.modified = True
+            idxs = frozenset(int(x) for x in request.form.getlist("remove_index") if x.isdigit())
+            if idxs:
+                items = [it for i, it in enumerate(items) if i not in idxs]
+                session["recipe_items"] = items
 
         elif action == "clear_items":
             session["recipe_items"] = []
             items = []
-            session.modified = True
 
         elif action == "clear_picker":
             session["recipe_picker"] = {}
             picker = session["recipe_picker"]
-            session.modified = True
 
         # save/send (deferred wiring)
         elif action == "save_to_my_list":
@@ -260,24 +259,28 @@ def recipes():
     notice = session.pop("recipe_notice", "")
 
     # totals and weighted per-100g
-    totals = {n: 0.0 for n in names}
+    # One pass over the items: each item's per100 values (in _NAMES order) are
+    # weighted by its grams into a positional accumulator, one slot per nutrient
+    item_views = [_item_view(row) for row in items]
     total_weight = 0.0
-    for it in items:
+    acc = [0.0] * len(names)
+    for it in item_views:
         g = float(it["grams"])
         total_weight += g
-        per100_i = it["per100"]
-        for n in names:
-            totals[n] += float(per100_i.get(n, 0.0)) * g / 100.0
+        for i, v in enumerate(_get_all(it["per100"])):  # every column in one C call
+            acc[i] += float(v) * g
+    totals = {n: t / 100.0 for n, t in zip(names, acc)}
 
-    recipe_per100 = {n: 0.0 for n in names}
     if total_weight > 0:
-        for n in names:
-            recipe_per100[n] = totals[n] / total_weight * 100.0
+        scale = 100.0 / total_weight
+        recipe_per100 = {n: totals[n] * scale for n in names}
+    else:
+        recipe_per100 = dict(_ZERO_NUTR)
 
     return render_template(
         "recipes.html",
         nutrient_names=names,
-        items=items,
+        items=item_views,
         search_hits=search_hits,
         picked_detail=picked_detail,
         picked_portions=picked_portions,
@@ -1,151 +1,126 @@
 # app_blueprints/reports.py
-from flask import Blueprint, render_template, session, make_response, request, current_app
-import io
+from flask import Blueprint, render_template, stream_template, session, request, current_app, Response
 import csv
-import os
-import json
 import datetime as _dt
+from functools import lru_cache
 
 from nutrition.services import history_store
-from nutrition.utils import get_targets
+from nutrition.constants import ALL_HISTORY_NUTRIENTS
+from nutrition.utils import get_targets, session_user_id
 
 reports_bp = Blueprint("reports", __name__)
 
 FEATURED_NUTRIENTS = ["Sodium", "Potassium", "Protein", "Calories"]
-ALL_HISTORY_NUTRIENTS = [
-    "Sodium", "Protein", "Carbs", "Fat", "Sat Fat", "Mono Fat", "Poly Fat",
-    "Sugar", "Potassium", "Calcium", "Magnesium", "Iron", "Calories",
-]
 
 
-def _load_history_from_files() -> dict:
+def _history_days():
     """
-    Load per-user history from instance/history/<uid>.json.
-
-    Returns either:
-      - { "YYYY-MM-DD": day_record, ... }
-      - OR { "days": { "YYYY-MM-DD": day_record, ... } }
-      - OR { "days": [ { "date": "...", ... }, ... ] }
-      - OR [ { "date": "...", ... }, ... ]
+    (history, date-sorted items) for the signed-in user, from the history_store
+    file (see history_store.days_by_date; both are cached, so treat them as
+    read-only; days carry complete totals). Read-only: legacy session["history"]
+    is imported on sign-in and finalize (utils.import_session_history).
     """
-    user = session.get("user") or {}
-    uid = user.get("id") or user.get("uid") or "anon"
-
-    hist_dir = os.path.join(current_app.instance_path, "history")
-    path = os.path.join(hist_dir, f"{uid}.json")
-
-    if not os.path.exists(path):
-        return {}
-
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception:
-        return {}
-
-    # Normalize to {date_str: record}
-    if isinstance(data, dict):
-        # { "days": {...} } or { "days": [ ... ] }
-        if "days" in data:
-            days = data["days"]
-            if isinstance(days, dict):
-                return days
-            if isinstance(days, list):
-                out = {}
-                for rec in days:
-                    if isinstance(rec, dict):
-                        d = rec.get("date")
-                        if d:
-                            out[d] = rec
-                return out
-        # Already { "YYYY-MM-DD": {...}, ... }
-        return data
-
-    if isinstance(data, list):
-        out = {}
-        for rec in data:
-            if isinstance(rec, dict):
-                d = rec.get("date")
-                if d:
-                    out[d] = rec
-        return out
-
-    return {}
-
-
-def sum_named_nutrients(daymap: dict, names=ALL_HISTORY_NUTRIENTS) -> dict:
-    """Sum only the nutrients we care about across today's items (daymap values)."""
-    totals = {n: 0.0 for n in names}
-    for rec in (daymap or {}).values():
-        n = rec.get("nutrients", {})
-        for k in names:
-            v = n.get(k)
-            if isinstance(v, (int, float)):
-                totals[k] += float(v)
-    return totals
+    return history_store.days_by_date(current_app.instance_path, session_user_id())
 
 
 @reports_bp.route("/history", endpoint="history")
 def history():
-    history = session.get("history", {})
-    dates = sorted(history.keys(), reverse=True)
-    rows = []
-    for d in dates:
-        rec = history.get(d, {})
-        entries = rec.get("entries", [])
-        totals = rec.get("totals") or {}
-        if not totals or any(k not in totals for k in ALL_HISTORY_NUTRIENTS):
-            dm = {str(i): e for i, e in enumerate(entries)}
-            totals = sum_named_nutrients(dm)
-            rec["totals"] = totals
-        rows.append({"date": d, "totals": totals, "entries": entries})
-    return render_template(
-        "app/history.html",
-        days=rows,
-        all_cols=ALL_HISTORY_NUTRIENTS,
-        featured=FEATURED_NUTRIENTS,
+    # Totals are complete on every day (history_store.with_totals), so no per-day fix-up here
+    rows = [
+        {"date": d, "totals": rec.get("totals") or {}, "entries": rec.get("entries", [])}
+        for d, rec in reversed(_history_days()[1])
+    ]
+    # Stream the page: the table is sent in chunks as the template renders it
+    return Response(
+        stream_template(
+            "app/history.html",
+            days=rows,
+            all_cols=ALL_HISTORY_NUTRIENTS,
+            featured=FEATURED_NUTRIENTS,
+        )
     )
 
 
+class _Echo:
+    """File-like sink for csv.writer: write() returns the line instead of buffering it."""
+    def write(self, value):
+        return value
+
+
 @reports_bp.route("/history_csv", endpoint="history_csv")
 def history_csv():
-    history = session.get("history", {})
+    history, items = _history_days()
     date_q = request.args.get("date")
-    fieldnames = ["Date"] + ALL_HISTORY_NUTRIENTS
-
-    output = io.StringIO()
-    w = csv.DictWriter(output, fieldnames=fieldnames)
-    w.writeheader()
-
-    def _write_row(d, totals):
-        row = {"Date": d}
-        for n in ALL_HISTORY_NUTRIENTS:
-            row[n] = round(totals.get(n, 0.0), 2)
-        w.writerow(row)
 
     if date_q:
         rec = history.get(date_q)
-        if rec:
-            totals = rec.get("totals") or {}
-            if not totals or any(k not in totals for k in ALL_HISTORY_NUTRIENTS):
-                dm = {str(i): e for i, e in enumerate(rec.get("entries", []))}
-                totals = sum_named_nutrients(dm)
-            _write_row(date_q, totals)
+        days = [(date_q, rec)] if rec else []
         filename = f"history_{date_q}.csv"
     else:
-        for d in sorted(history.keys()):
-            rec = history[d]
-            totals = rec.get("totals") or {}
-            if not totals or any(k not in totals for k in ALL_HISTORY_NUTRIENTS):
-                dm = {str(i): e for i, e in enumerate(rec.get("entries", []))}
-                totals = sum_named_nutrients(dm)
-            _write_row(d, totals)
+        days = items
         filename = "history_all_days.csv"
 
-    resp = make_response(output.getvalue())
-    resp.headers["Content-Type"] = "text/csv"
-    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return resp
+    def generate():
+        # writerow() hands back the formatted line (see _Echo); each row is yielded as made
+        w = csv.writer(_Echo())
+        writerow, _r, cols = w.writerow, round, ALL_HISTORY_NUTRIENTS
+        yield writerow(["Date", *cols])
+        for d, rec in days:
+            get = (rec.get("totals") or {}).get
+            yield writerow([d, *[_r(get(n, 0.0), 2) for n in cols]])
+
+    return Response(
+        generate(),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# weekly_preview nutrient config: (name, unit) in display order
+_WEEKLY_FEATURED = (
+    ("Sodium", "mg"),
+    ("Potassium", "mg"),
+    ("Protein", "g"),
+    ("Calories", "kcal"),
+)
+
+_WEEKLY_SUPPLEMENTAL = (
+    ("Phosphorus", "mg"),
+    ("Calcium", "mg"),
+    ("Magnesium", "mg"),
+    ("Cholesterol", "mg"),
+    ("Carbs", "g"),
+    ("Fat", "g"),
+    ("Sat Fat", "g"),
+    ("Mono Fat", "g"),
+    ("Poly Fat", "g"),
+    ("Sugar", "g"),
+    ("Iron", "mg"),
+)
+
+# Demo (lo, hi) target ranges for featured nutrients without a Daily Diary target
+_WEEKLY_DEMO_RANGES = {
+    "Protein": (60, 70),
+    "Calories": (1800, 2200),
+    "Phosphorus": (0, 800),
+    "Calcium": (1000, 1000),
+    "Magnesium": (400, 400),
+}
+
+# weekly_preview status badges: (text, css class)
+_BADGE_OK = ("OK", "badge bg-success")
+_BADGE_WARN = ("Slightly High", "badge bg-warning text-dark")
+_BADGE_HIGH = ("High", "badge bg-danger")
+_BADGE_LOW = ("Low", "badge bg-warning text-dark")
+_BADGE_NA = ("—", "badge bg-secondary")
+
+
+@lru_cache(maxsize=64)
+def _demo_target_label(lo: float, hi: float) -> str:
+    """Target label for a demo range: "lo–hi", or "≈goal" for a single value."""
+    if lo > 0 and hi > 0 and lo < hi:
+        return f"{int(lo)}–{int(hi)}"
+    return f"≈{int(hi if hi > 0 else lo)}"
 
 
 @reports_bp.route("/weekly_preview", endpoint="weekly_preview")
@@ -158,13 +133,9 @@ def weekly_preview():
     """
     user = session.get("user") or {}
     patient_name = user.get("name") or user.get("email") or "Demo User"
-    user_id = user.get("email") or user.get("id") or "demo@example.com"
-
-    # --- 1. Load days from history_store ---
-    all_days = history_store.list_days(current_app.instance_path, user_id)
-    by_date = {d.get("date"): d for d in all_days if d.get("date")}
+    user_id = session_user_id()
 
-    # --- 2. Determine window size from query ---
+    # --- 1. Determine window size from query ---
     try:
         days_param = int(request.args.get("days", 7))
     except (TypeError, ValueError):
@@ -175,12 +146,13 @@ def weekly_preview():
 
     today = _dt.date.today()
     # Oldest -> newest, length = days_param
-    date_keys = [
-        (today - _dt.timedelta(days=i)).isoformat()
-        for i in range(days_param - 1, -1, -1)
-    ]
+    end = today.toordinal() + 1
+    fromordinal = _dt.date.fromordinal
+    date_keys = [fromordinal(o).isoformat() for o in range(end - days_param, end)]
     window_days = len(date_keys)
 
+    # --- 2. Load just the window's days from history_store ---
+    by_date = history_store.list_days_window(current_app.instance_path, user_id, date_keys)
     days_in_window = [by_date[d] for d in date_keys if d in by_date]
     days_with_data = len(days_in_window)
     missing_days = max(window_days - days_with_data, 0)
@@ -198,7 +170,7 @@ def weekly_preview():
 
     tgt = get_targets()  # e.g. {"na": 1500, "k": 3400}
 
-    # If no days at all in this window, show empty state
+    # If no days at all in this window, show empty state (before any per-nutrient work)
     if not days_in_window:
         return render_template(
             "weekly_preview.html",
@@ -210,107 +182,76 @@ def weekly_preview():
             targets=tgt,
         )
 
-    # --- 3. Nutrients config ---
-
-    featured_order = [
-        ("Sodium", "mg"),
-        ("Potassium", "mg"),
-        ("Protein", "g"),
-        ("Calories", "kcal"),
-    ]
-
-    supplemental_order = [
-        ("Phosphorus", "mg"),
-        ("Calcium", "mg"),
-        ("Magnesium", "mg"),
-        ("Cholesterol", "mg"),
-        ("Carbs", "g"),
-        ("Fat", "g"),
-        ("Sat Fat", "g"),
-        ("Mono Fat", "g"),
-        ("Poly Fat", "g"),
-        ("Sugar", "g"),
-        ("Iron", "mg"),
-    ]
-
-    demo_defaults = {
-        "Protein": (60, 70),
-        "Calories": (1800, 2200),
-        "Phosphorus": (0, 800),
-        "Calcium": (1000, 1000),
-        "Magnesium": (400, 400),
-    }
-
     # --- helpers ---
 
-    def collect(nm: str):
-        vals = []
-        for d in days_in_window:
-            totals = d.get("totals", {}) or {}
-            v = totals.get(nm)
+    # One pass over the window: [count, sum, min, max] per nutrient (missing days/keys skipped)
+    stats = {nm: [0, 0.0, 0.0, 0.0] for nm, _ in _WEEKLY_FEATURED + _WEEKLY_SUPPLEMENTAL}
+    stat_items = tuple(stats.items())
+    for d in days_in_window:
+        get = (d.get("totals") or {}).get
+        for nm, st in stat_items:
+            v = get(nm)
             if isinstance(v, (int, float)):
-                vals.append(float(v))
-        return vals
+                if st[0]:
+                    if v < st[2]: st[2] = v
+                    if v > st[3]: st[3] = v
+                else:
+                    st[2] = st[3] = v
+                st[0] += 1
+                st[1] += v
+
+    def summarize(nm: str):
+        """(has_data, avg, min, max) for a nutrient over the window."""
+        n, total, lo, hi = stats[nm]
+        return n > 0, (total / n if n else 0.0), lo, hi
 
     def fmt0(v: float) -> str:
-        """Format as x,xxx with no decimals."""
-        try:
-            return f"{v:,.0f}"
-        except Exception:
-            return "0"
-
-    def range_fmt(vals):
-        if not vals:
+        """Format as x,xxx with no decimals (inputs are always numeric here)."""
+        return format(v, ",.0f")
+
+    def range_fmt(has_data, lo, hi):
+        if not has_data:
             return "0–0"
-        return f"{fmt0(min(vals))}–{fmt0(max(vals))}"
+        return f"{fmt0(lo)}–{fmt0(hi)}"
+
+    # Max-limit nutrients (Daily Diary targets): label, OK ceiling, "slightly high" ceiling
+    limits = {}
+    for nm, key, default in (("Sodium", "na", 1500), ("Potassium", "k", 3400)):
+        maxv = float(tgt.get(key, default))
+        limits[nm] = (f"<{int(maxv)}", maxv, maxv * 1.2)
 
     def featured_target_and_status(nm: str, avg: float):
         # Sodium & Potassium use Daily Diary targets
-        if nm == "Sodium":
-            maxv = float(tgt.get("na", 1500))
-            target_label = f"<{int(maxv)}"
-            if avg <= maxv:
-                return target_label, ("OK", "badge bg-success")
-            if avg <= maxv * 1.2:
-                return target_label, ("Slightly High", "badge bg-warning text-dark")
-            return target_label, ("High", "badge bg-danger")
-
-        if nm == "Potassium":
-            maxk = float(tgt.get("k", 3400))
-            target_label = f"<{int(maxk)}"
-            if avg <= maxk:
-                return target_label, ("OK", "badge bg-success")
-            if avg <= maxk * 1.2:
-                return target_label, ("Slightly High", "badge bg-warning text-dark")
-            return target_label, ("High", "badge bg-danger")
+        limit = limits.get(nm)
+        if limit is not None:
+            target_label, ok_max, warn_max = limit
+            return target_label, (_BADGE_OK if avg <= ok_max else _BADGE_WARN if avg <= warn_max else _BADGE_HIGH)
 
         # Others use demo ranges
-        lo, hi = demo_defaults.get(nm, (0.0, 0.0))
+        lo, hi = _WEEKLY_DEMO_RANGES.get(nm, (0.0, 0.0))
         if lo == hi == 0.0:
-            return "—", ("—", "badge bg-secondary")
+            return "—", _BADGE_NA
 
+        target_label = _demo_target_label(lo, hi)
         if lo > 0 and hi > 0 and lo < hi:
-            target_label = f"{int(lo)}–{int(hi)}"
             if avg < lo * 0.95:
-                return target_label, ("Low", "badge bg-warning text-dark")
+                return target_label, _BADGE_LOW
             if avg > hi * 1.05:
-                return target_label, ("High", "badge bg-danger")
-            return target_label, ("OK", "badge bg-success")
+                return target_label, _BADGE_HIGH
+            return target_label, _BADGE_OK
 
         goal = hi if hi > 0 else lo
-        target_label = f"≈{int(goal)}"
         if avg < goal * 0.85:
-            return target_label, ("Low", "badge bg-warning text-dark")
+            return target_label, _BADGE_LOW
         if avg > goal * 1.15:
-            return target_label, ("High", "badge bg-danger")
-        return target_label, ("OK", "badge bg-success")
+            return target_label, _BADGE_HIGH
+        return target_label, _BADGE_OK
 
-    # --- 4. Build rows ---
+    # --- 3. Build rows ---
 
     featured_rows = []
-    for nm, unit in featured_order:
-        vals = collect(nm)
-        avg = (sum(vals) / len(vals)) if vals else 0.0
+    for nm, unit in _WEEKLY_FEATURED:
+        has_data, avg, lo, hi = summarize(nm)
         avg_val = round(avg, 0)
         target_label, (status_text, status_cls) = featured_target_and_status(nm, avg)
 
@@ -321,19 +262,18 @@ def weekly_preview():
                 "target": target_label,
                 "avg": avg_val,
                 "avg_display": fmt0(avg_val),
-                "range": range_fmt(vals),
+                "range": range_fmt(has_data, lo, hi),
                 "status_text": status_text,
                 "status_cls": status_cls,
             }
         )
 
     supplemental_rows = []
-    for nm, unit in supplemental_order:
-        vals = collect(nm)
-        avg = (sum(vals) / len(vals)) if vals else 0.0
+    for nm, unit in _WEEKLY_SUPPLEMENTAL:
+        has_data, avg, lo, hi = summarize(nm)
         avg_val = round(avg, 0)
-        min_v = round(min(vals), 0) if vals else 0
-        max_v = round(max(vals), 0) if vals else 0
+        min_v = round(lo, 0) if has_data else 0
+        max_v = round(hi, 0) if has_data else 0
 
         supplemental_rows.append(
             {
@@ -348,7 +288,7 @@ def weekly_preview():
             }
         )
 
-    # --- 5. Auto-generated notes ---
+    # --- 4. Auto-generated notes ---
 
     notes = []
     f_na = next((r for r in featured_rows if r["name"] == "Sodium"), None)
@@ -365,7 +305,7 @@ def weekly_preview():
             "if advised by your care team."
         )
 
-    # --- 6. Render ---
+    # --- 5. Render ---
 
     return render_template(
         "weekly_preview.html",
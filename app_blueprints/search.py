@@ -1,11 +1,18 @@
 # app_blueprints/search.py
-from flask import Blueprint, render_template, request, session, redirect, url_for, current_app
+from flask import Blueprint, render_template, request, session, redirect, url_for, current_app, flash
 import os
 import json
 import re
+import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from operator import itemgetter
 
 from nutrition.constants import ALLOWED_TYPES, TARGET_NUTRIENTS
-from nutrition.services.usda_client import search_foods
+from nutrition.utils import parse_float, write_atomic
+from nutrition.services.usda_client import get_food_detail, search_foods
+from nutrition.services.nutrients import _num, normalize_per100 as _normalize_per100
 from nutrition.services.portions import portion_match_from_labels  # (future)
 from app_blueprints.luckysheet_api import append_rows_direct
 
@@ -15,169 +22,73 @@ search_bp = Blueprint("search", __name__, url_prefix="/search")
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _coerce_calories_from_usda(n: dict) -> float:
-    if not n:
-        return 0.0
-    kcal = ["Calories", "Energy (kcal)", "Energy", "calories", "Energy kcal"]
-    kj = ["Energy (kJ)", "Energy (kj)", "kJ", "Kilojoules"]
-    for k in kcal:
-        v = n.get(k)
-        if v not in (None, "", "NA"):
-            try:
-                return float(v)
-            except Exception:
-                pass
-    for k in kj:
-        v = n.get(k)
-        if v not in (None, "", "NA"):
-            try:
-                return float(v) / 4.184
-            except Exception:
-                pass
-    return 0.0
+# Univer nutrient columns (internal names, no units); normalize_per100 always
+# fills these as floats. Interned, like _TN_NAMES, so lookups between our own
+# dicts hit on identity.
+_WANTED = tuple(map(sys.intern, (
+    "Sodium",
+    "Potassium",
+    "Protein",
+    "Calories",
+    "Cholesterol",
+    "Carbs",
+    "Fat",
+    "Sat Fat",
+    "Mono Fat",
+    "Poly Fat",
+    "Sugar",
+    "Calcium",
+    "Magnesium",
+    "Iron",
+)))
+
+_get_wanted = itemgetter(*_WANTED)
+
+# foods_table.json header; must match HEAD2_COLUMNS in Univer main.js (nutrients in _WANTED order)
+UNIVER_HEADER = [
+    "Food",
+    "Serving Size",
+    "Serving Unit",
+    "Label Units",
+    "Unit Type",
+    "Sodium (mg)",
+    "Potassium (mg)",
+    "Protein (g)",
+    "Calories",
+    "Cholesterol (mg)",
+    "Carbs (g)",
+    "Fat (g)",
+    "Sat Fat (g)",
+    "Mono Fat (g)",
+    "Poly Fat (g)",
+    "Sugar (g)",
+    "Calcium (mg)",
+    "Magnesium (mg)",
+    "Iron (mg)",
+]
+
+
+# TARGET_NUTRIENTS columns, and the labelNutrients key for each (e.g. "Sat Fat" -> "satfat")
+_TN_NAMES = tuple(map(sys.intern, TARGET_NUTRIENTS.values()))
+_TN_LABEL_KEYS = tuple((name, name.lower().replace(" ", "")) for name in _TN_NAMES)
 
 
 def normalize_per100(n: dict) -> dict:
     """
-    Take a raw nutrient dict from USDA and normalize it into our
-    canonical per-100g form with friendly keys.
+    The services normalize_per100, plus a float 'Cholesterol' (a Univer
+    column that the daily view does not track).
     """
-    n = dict(n or {})
+    per100 = _normalize_per100(n)
+    if "Cholesterol" not in per100 and "Cholesterol, total" in per100:
+        per100["Cholesterol"] = per100["Cholesterol, total"]
+    per100["Cholesterol"] = _num(per100.get("Cholesterol"))
+    return per100
 
-    # Calories
-    if not n.get("Calories"):
-        n["Calories"] = _coerce_calories_from_usda(n)
 
-    # Carbs
-    if "Carbs" not in n:
-        for k in ["Carbohydrate, by difference", "Carbohydrate", "Carbohydrates"]:
-            if k in n:
-                try:
-                    n["Carbs"] = float(n[k] or 0)
-                except Exception:
-                    n["Carbs"] = 0.0
-                break
-
-    # Fat
-    if "Fat" not in n:
-        for k in ["Total lipid (fat)", "Total Fat"]:
-            if k in n:
-                try:
-                    n["Fat"] = float(n[k] or 0)
-                except Exception:
-                    n["Fat"] = 0.0
-                break
-
-    # Sat fat
-    if "Sat Fat" not in n:
-        for k in ["Fatty acids, total saturated", "Saturated Fat"]:
-            if k in n:
-                try:
-                    n["Sat Fat"] = float(n[k] or 0)
-                except Exception:
-                    n["Sat Fat"] = 0.0
-                break
-
-    # Mono fat
-    if "Mono Fat" not in n:
-        for k in ["Fatty acids, total monounsaturated"]:
-            if k in n:
-                try:
-                    n["Mono Fat"] = float(n[k] or 0)
-                except Exception:
-                    n["Mono Fat"] = 0.0
-                break
-
-    # Poly fat
-    if "Poly Fat" not in n:
-        for k in ["Fatty acids, total polyunsaturated"]:
-            if k in n:
-                try:
-                    n["Poly Fat"] = float(n[k] or 0)
-                except Exception:
-                    n["Poly Fat"] = 0.0
-                break
-
-    # Sugar
-    if "Sugar" not in n:
-        for k in ["Sugars, total including NLEA", "Sugars, total", "Sugar"]:
-            if k in n:
-                try:
-                    n["Sugar"] = float(n[k] or 0)
-                except Exception:
-                    n["Sugar"] = 0.0
-                break
-
-    # Sodium / Potassium / Calcium / Magnesium / Iron / Phosphorus
-    if "Sodium" not in n and "Sodium, Na" in n:
-        try:
-            n["Sodium"] = float(n["Sodium, Na"] or 0)
-        except Exception:
-            n["Sodium"] = 0.0
-    if "Potassium" not in n and "Potassium, K" in n:
-        try:
-            n["Potassium"] = float(n["Potassium, K"] or 0)
-        except Exception:
-            n["Potassium"] = 0.0
-    if "Calcium" not in n and "Calcium, Ca" in n:
-        try:
-            n["Calcium"] = float(n["Calcium, Ca"] or 0)
-        except Exception:
-            n["Calcium"] = 0.0
-    if "Magnesium" not in n and "Magnesium, Mg" in n:
-        try:
-            n["Magnesium"] = float(n["Magnesium, Mg"] or 0)
-        except Exception:
-            n["Magnesium"] = 0.0
-    if "Iron" not in n and "Iron, Fe" in n:
-        try:
-            n["Iron"] = float(n["Iron, Fe"] or 0)
-        except Exception:
-            n["Iron"] = 0.0
-    if "Phosphorus" not in n and "Phosphorus, P" in n:
-        try:
-            n["Phosphorus"] = float(n["Phosphorus, P"] or 0)
-        except Exception:
-            n["Phosphorus"] = 0.0
-
-    # Cholesterol (mg)
-    if "Cholesterol" not in n:
-        for k in ["Cholesterol", "Cholesterol, total"]:
-            if k in n:
-                try:
-                    n["Cholesterol"] = float(n[k] or 0)
-                except Exception:
-                    n["Cholesterol"] = 0.0
-                break
-
-    # Canonical set we care about, coerced to float
-    # (internal names, no units)
-    wanted = [
-        "Sodium",
-        "Potassium",
-        "Protein",
-        "Calories",
-        "Cholesterol",
-        "Carbs",
-        "Fat",
-        "Sat Fat",
-        "Mono Fat",
-        "Poly Fat",
-        "Sugar",
-        "Calcium",
-        "Magnesium",
-        "Iron",
-    ]
-    for k in wanted:
-        try:
-            n[k] = float(n.get(k, 0.0) or 0.0)
-        except Exception:
-            n[k] = 0.0
-    return n
+_GRAMS_PER_UNIT_DEFAULT = {"g": 100.0, "cup": 240.0, "tbsp": 15.0, "tsp": 5.0, "clove": 3.0}
 
 
 def compute_portion_preview(item: dict) -> None:
-    GRAMS_PER_UNIT_DEFAULT = {"g": 100.0, "cup": 240.0, "tbsp": 15.0, "tsp": 5.0, "clove": 3.0}
     if not isinstance(item, dict):
         return
     per100 = normalize_per100(item.get("nutrients", {}))
@@ -188,15 +99,19 @@ def compute_portion_preview(item: dict) -> None:
     unit_grams = pref.get("unit_grams")
 
     if unit_key == "g":
-        grams = float(unit_grams) if unit_grams not in (None, "") else GRAMS_PER_UNIT_DEFAULT["g"]
+        grams = float(unit_grams) if unit_grams not in (None, "") else _GRAMS_PER_UNIT_DEFAULT["g"]
     else:
-        grams = float(unit_grams) if unit_grams not in (None, "") else GRAMS_PER_UNIT_DEFAULT.get(unit_key, 0.0)
+        grams = float(unit_grams) if unit_grams not in (None, "") else _GRAMS_PER_UNIT_DEFAULT.get(unit_key, 0.0)
 
+    factor = grams * 0.01  # per-100g -> per-portion, hoisted out of the loop
     portion_nutrients = {}
     for k, v in per100.items():
+        if type(v) is float:  # canonical keys after normalize_per100: no conversion needed
+            portion_nutrients[k] = round(v * factor, 2)
+            continue
         try:
-            portion_nutrients[k] = round((float(v) * grams) / 100.0, 2)
-        except Exception:
+            portion_nutrients[k] = round(float(v) * factor, 2)
+        except (TypeError, ValueError):
             portion_nutrients[k] = 0.0
 
     item.setdefault("computed", {})
@@ -218,42 +133,46 @@ _FRACTIONS = {
     "⅞": 0.875,
 }
 
-import re as _re
+_PAREN_RE = re.compile(r"\(.*?\)")
+_HH_RE = re.compile(
+    r"^\s*(?P<num>(?:\d+(?:\.\d+)?)|(?:\d+\s+\d+/\d+)|(?:\d+/\d+)|(?:[¼½¾⅓⅔⅛⅜⅝⅞]))\s*(?P<label>[A-Za-z].*)?$"
+)
 
 
 def _parse_fraction_token(tok: str):
     tok = tok.strip()
-    if tok in _FRACTIONS:
-        return _FRACTIONS[tok]
+    if tok.isdecimal():  # the common case ("1", "3"): no regex gate needed
+        return float(tok)
+    frac = _FRACTIONS.get(tok)
+    if frac is not None:
+        return frac
     if "/" in tok:
-        try:
-            a, b = tok.split("/", 1)
-            return float(a) / float(b)
-        except Exception:
+        a, _, b = tok.partition("/")
+        if a.isdecimal() and b.isdecimal():
+            den = int(b)
+            return int(a) / den if den else None
+        num, den = parse_float(a, None), parse_float(b, None)
+        if num is None or not den:
             return None
-    try:
-        return float(tok)
-    except Exception:
-        return None
+        return num / den
+    return parse_float(tok, None)
 
 
+@lru_cache(maxsize=1024)
 def split_household(text: str):
     """
     Turn '3 slices' -> ('3','slices')
          '1 1/2 cups' -> ('1.5','cups')
          '½ cup (120 ml)' -> ('0.5','cup')
          'Slice' -> ('','Slice')
-    Removes any (...) trailing details.
+    Removes any (...) trailing details. Cached: labels repeat across foods/exports.
     """
     if not text:
         return ("", "")
-    t = _re.sub(r"\(.*?\)", "", str(text)).strip()
+    t = _PAREN_RE.sub("", str(text)).strip()
     if not t:
         return ("", "")
-    m = _re.match(
-        r"^\s*(?P<num>(?:\d+(?:\.\d+)?)|(?:\d+\s+\d+/\d+)|(?:\d+/\d+)|(?:[¼½¾⅓⅔⅛⅜⅝⅞]))\s*(?P<label>[A-Za-z].*)?$",
-        t,
-    )
+    m = _HH_RE.match(t)
     if not m:
         return ("", t.strip())
 
@@ -280,6 +199,100 @@ def split_household(text: str):
 # Routes
 # ---------------------------------------------------------------------------
 
+def _food_nutrients(food: dict, _tn_get=TARGET_NUTRIENTS.get) -> dict:
+    """
+    Per-100g TARGET_NUTRIENTS values (plus Cholesterol) for one /foods/search hit.
+    Search results keep only display fields in the session; search() stores
+    these in _NUTRIENTS_BY_FDC for the add action to pick up.
+    """
+    # One pass over foodNutrients: TARGET_NUTRIENTS by nutrient id, and Cholesterol
+    # (not an id-mapped target) as the first numeric nutrient whose *name* mentions it.
+    # Handle BOTH name styles:
+    #  - nested:  nut["nutrient"]["name"]
+    #  - flat:    nut["nutrientName"]
+    zeroed = dict.fromkeys(_TN_NAMES, 0.0)
+    chol = None
+    for nut in (food.get("foodNutrients") or []):
+        nutrient_meta = nut.get("nutrient") or {}
+        key = _tn_get(nutrient_meta.get("id") or nut.get("nutrientId"))
+        if key is not None:
+            amt = nut.get("amount") or nut.get("value")
+            if isinstance(amt, (int, float)):
+                zeroed[key] = float(amt)
+        elif chol is None:
+            meta = nutrient_meta or nut
+            if "cholesterol" in (meta.get("name") or meta.get("nutrientName") or "").lower():
+                amt = nut.get("amount") or nut.get("value")
+                if isinstance(amt, (int, float)):
+                    chol = float(amt)
+
+    # If no foodNutrients (e.g. some branded items), use labelNutrients as fallback
+    if (not food.get("foodNutrients")) and food.get("labelNutrients"):
+        for name, key in _TN_LABEL_KEYS:
+            val_container = food["labelNutrients"].get(key)
+            if isinstance(val_container, dict):
+                val = val_container.get("value")
+            else:
+                val = val_container
+            if isinstance(val, (int, float)):
+                zeroed[name] = float(val)
+
+    zeroed["Cholesterol"] = chol or 0.0
+
+    # If still zero, try labelNutrients['cholesterol'] (branded foods)
+    if zeroed.get("Cholesterol", 0.0) == 0.0 and food.get("labelNutrients"):
+        ln = food["labelNutrients"]
+        chol_entry = ln.get("cholesterol")
+        if isinstance(chol_entry, dict):
+            val = chol_entry.get("value")
+        else:
+            val = chol_entry
+        if isinstance(val, (int, float)):
+            zeroed["Cholesterol"] = float(val)
+
+    return zeroed
+
+
+# fdcId -> _food_nutrients() for recent search results (the session keeps
+# only display fields); least recently used entries are evicted past the cap.
+# Shared by all request threads, so every access holds the lock.
+_NUTRIENTS_BY_FDC = OrderedDict()
+_NUTRIENTS_BY_FDC_MAX = 2048
+_NUTRIENTS_LOCK = threading.Lock()
+
+
+def _remember_nutrients(fid: str, nutrients: dict) -> None:
+    with _NUTRIENTS_LOCK:
+        _NUTRIENTS_BY_FDC[fid] = nutrients
+        _NUTRIENTS_BY_FDC.move_to_end(fid)
+        while len(_NUTRIENTS_BY_FDC) > _NUTRIENTS_BY_FDC_MAX:
+            _NUTRIENTS_BY_FDC.popitem(last=False)
+
+
+def _nutrients_for(fid: str):
+    """
+    Per-100g nutrients for a search result being added. Served from
+    _NUTRIENTS_BY_FDC when this process saw the search; otherwise (restart,
+    another worker, evicted) extracted the same way from the USDA food detail.
+    Returns None if the detail can't be fetched.
+    """
+    with _NUTRIENTS_LOCK:
+        nutrients = _NUTRIENTS_BY_FDC.get(fid)
+        if nutrients is not None:
+            _NUTRIENTS_BY_FDC.move_to_end(fid)
+            return nutrients
+    detail = get_food_detail(fid)
+    if not detail:
+        return None
+    nutrients = _food_nutrients(detail)
+    _remember_nutrients(fid, nutrients)
+    return nutrients
+
+
+# Ranking bonus per USDA data type: prefer USDA "true" data over branded
+_DATA_TYPE_BONUS = {"SR Legacy": 5.0, "Foundation": 5.0, "Survey (FNDDS)": 3.0, "Branded": 1.0}
+
+
 @search_bp.route("/search", methods=["GET"], endpoint="search")
 def search():
     q = request.args.get("query", "").strip()
@@ -301,7 +314,10 @@ def search():
     data_types = selected_types if selected_types else None
     foods = search_foods(q, page_size=100, page_number=1, data_types=data_types)
 
-    results = []
+    # Rank while building, so the best matches show up in the top 10: one
+    # (score, result) pair per food, lowercased text computed once per food
+    q_low = q.lower()
+    scored = []
     for food in foods:
         dt = food.get("dataType", "")
         if dt not in ALLOWED_TYPES:
@@ -310,117 +326,58 @@ def search():
         fdc = str(food.get("fdcId", ""))
         desc = food.get("description", "") or "Unknown"
         detail = food.get("brandOwner") if dt == "Branded" else food.get("foodCategory", "—")
+        detail = detail or "—"
 
-        # Build base nutrient dict from TARGET_NUTRIENTS mapping (by nutrient id)
-        zeroed = {name: 0.0 for name in TARGET_NUTRIENTS.values()}
-        for nut in (food.get("foodNutrients") or []):
-            nid = (nut.get("nutrient") or {}).get("id") or nut.get("nutrientId")
-            amt = nut.get("amount") or nut.get("value")
-            if nid in TARGET_NUTRIENTS and isinstance(amt, (int, float)):
-                zeroed[TARGET_NUTRIENTS[nid]] = float(amt)
-
-        # If no foodNutrients (e.g. some branded items), use labelNutrients as fallback
-        if (not food.get("foodNutrients")) and food.get("labelNutrients"):
-            for _, name in TARGET_NUTRIENTS.items():
-                key = name.lower().replace(" ", "")
-                val_container = food["labelNutrients"].get(key)
-                if isinstance(val_container, dict):
-                    val = val_container.get("value")
-                else:
-                    val = val_container
-                if isinstance(val, (int, float)):
-                    zeroed[name] = float(val)
-
-        # Ensure Cholesterol exists in the dict
-        if "Cholesterol" not in zeroed:
-            zeroed["Cholesterol"] = 0.0
-
-        # Try to detect cholesterol from foodNutrients by *name*.
-        # Handle BOTH styles:
-        #  - nested:  nut["nutrient"]["name"]
-        #  - flat:    nut["nutrientName"]
-        if zeroed.get("Cholesterol", 0.0) == 0.0:
-            for nut in (food.get("foodNutrients") or []):
-                nutrient_meta = nut.get("nutrient") or nut
-                nname = (
-                        nutrient_meta.get("name")
-                        or nutrient_meta.get("nutrientName")
-                        or ""
-                ).lower()
-                if "cholesterol" in nname:
-                    amt = nut.get("amount") or nut.get("value")
-                    if isinstance(amt, (int, float)):
-                        zeroed["Cholesterol"] = float(amt)
-                        break
-
-        # If still zero, try labelNutrients['cholesterol'] (branded foods)
-        if zeroed.get("Cholesterol", 0.0) == 0.0 and food.get("labelNutrients"):
-            ln = food["labelNutrients"]
-            chol_entry = ln.get("cholesterol")
-            if isinstance(chol_entry, dict):
-                val = chol_entry.get("value")
-            else:
-                val = chol_entry
-            if isinstance(val, (int, float)):
-                zeroed["Cholesterol"] = float(val)
-
-        results.append(
-            {
-                "fdcId": fdc,
-                "description": desc,
-                "detail": detail or "—",
-                "dataType": dt,
-                "nutrients": zeroed,
-                # branded/sizing metadata
-                "servingSize": food.get("servingSize"),
-                "servingSizeUnit": food.get("servingSizeUnit"),
-                "householdServingFullText": food.get("householdServingFullText"),
-                "brandOwner": food.get("brandOwner"),
-                "brandedFoodCategory": food.get("brandedFoodCategory"),
-            }
-        )
-
-    # --- Rank results so the best matches show up in the top 10 --------------
-
-    q_low = q.lower()
-
-    def _score_result(item: dict) -> float:
-        desc = (item.get("description") or "").lower()
-        detail_text = (item.get("detail") or "").lower()
-        dt = item.get("dataType") or ""
-
+        desc_low = desc.lower()
+        detail_low = detail.lower()
         score = 0.0
 
         # Exact description match
-        if desc == q_low:
+        if desc_low == q_low:
             score += 100.0
         # Description starts with query
-        if desc.startswith(q_low):
+        if desc_low.startswith(q_low):
             score += 50.0
         # Query appears anywhere in description
-        if q_low in desc:
+        if q_low in desc_low:
             score += 25.0
 
         # Match in detail (brand / category)
-        if detail_text == q_low:
+        if detail_low == q_low:
             score += 15.0
-        elif q_low in detail_text:
+        elif q_low in detail_low:
             score += 7.0
 
         # Prefer USDA "true" data over branded
-        if dt in ("SR Legacy", "Foundation"):
-            score += 5.0
-        elif dt == "Survey (FNDDS)":
-            score += 3.0
-        elif dt == "Branded":
-            score += 1.0
+        score += _DATA_TYPE_BONUS.get(dt, 0.0)
 
-        return score
+        scored.append((
+            score,
+            food,
+            {
+                "fdcId": fdc,
+                "description": desc,
+                "detail": detail,
+                "dataType": dt,
+                # branded/sizing metadata
+                "servingSize": food.get("servingSize"),
+                "servingSizeUnit": food.get("servingSizeUnit"),
+                "householdServingFullText": food.get("householdServingFullText"),
+                "brandOwner": food.get("brandOwner"),
+                "brandedFoodCategory": food.get("brandedFoodCategory"),
+            },
+        ))
 
-    results.sort(key=_score_result, reverse=True)
+    # Stable sort on score alone, so ties keep USDA's order
+    scored.sort(key=itemgetter(0), reverse=True)
 
     # Keep only the best 10 for the Pick Foods table
-    top_results = results[:10]
+    top = scored[:10]
+    top_results = [item for _, _, item in top]
+
+    # Nutrients stay server-side, keyed by fdcId, for the add action
+    for _, food, item in top:
+        _remember_nutrients(item["fdcId"], _food_nutrients(food))
 
     session["search_results"] = top_results
     session["search_query"] = q
@@ -460,16 +417,25 @@ def index():
 
     if request.method == "POST":
         action = request.form.get("action")
+        dirty = False  # write my_food_list back only if an action changed it
 
         if action == "add":
             selected_ids = request.form.getlist("selected_fdc")
             selected_items = [food for food in search_results if str(food.get("fdcId")) in selected_ids]
 
+            have_ids = {str(f.get("fdcId")) for f in my_food_list}
             for item in selected_items:
                 fid = str(item.get("fdcId"))
-                if any(str(f.get("fdcId")) == fid for f in my_food_list):
+                if fid in have_ids:
                     continue
-                per100 = normalize_per100(item.get("nutrients", {}))
+                # "nutrients" is only on results saved before slim sessions
+                nutrients = item.get("nutrients") or _nutrients_for(fid)
+                if nutrients is None:
+                    flash(f"Could not load nutrients for \"{item.get('description', fid)}\" "
+                          "from USDA; please try adding it again.", "error")
+                    continue
+                have_ids.add(fid)
+                per100 = normalize_per100(nutrients)
                 new_entry = {
                     "fdcId": fid,
                     "description": item.get("description", "(item)"),
@@ -486,8 +452,7 @@ def index():
                 }
                 compute_portion_preview(new_entry)
                 my_food_list.append(new_entry)
-
-            session["my_food_list"] = my_food_list
+                dirty = True
 
         elif action == "export_luckysheet":
             # Append ALL currently accumulated items to the Luckysheet DB
@@ -510,23 +475,9 @@ def index():
             #   "Magnesium (mg)",
             #   "Iron (mg)",
             #
-            # Here we use the *internal* names in the same order:
-            wanted = [
-                "Sodium",
-                "Potassium",
-                "Protein",
-                "Calories",
-                "Cholesterol",
-                "Carbs",
-                "Fat",
-                "Sat Fat",
-                "Mono Fat",
-                "Poly Fat",
-                "Sugar",
-                "Calcium",
-                "Magnesium",
-                "Iron",
-            ]
+            # Here we use the *internal* names in the same order: _WANTED
+            # (normalize_per100 guarantees every one is present as a float).
+            nutrient_cols = _get_wanted
 
             for f in my_food_list:
                 per100 = normalize_per100(f.get("nutrients", {}))
@@ -541,10 +492,8 @@ def index():
                     ssu,  # Serving Unit
                     num_label,  # Label Units
                     label,      # Unit Type (e.g., slices)
+                    *nutrient_cols(per100),
                 ]
-                for k in wanted:
-                    row.append(per100.get(k, 0.0) or 0.0)
-
                 rows_for_luckysheet.append(row)
 
             # Keep Luckysheet behavior as-is: append data rows only
@@ -558,34 +507,11 @@ def index():
                     os.makedirs(univer_dir, exist_ok=True)
                     json_path = os.path.join(univer_dir, "foods_table.json")
 
-                    # This header must match HEAD2_COLUMNS in Univer main.js
-                    univer_header = [
-                        "Food",
-                        "Serving Size",
-                        "Serving Unit",
-                        "Label Units",
-                        "Unit Type",
-                        "Sodium (mg)",
-                        "Potassium (mg)",
-                        "Protein (g)",
-                        "Calories",
-                        "Cholesterol (mg)",
-                        "Carbs (g)",
-                        "Fat (g)",
-                        "Sat Fat (g)",
-                        "Mono Fat (g)",
-                        "Poly Fat (g)",
-                        "Sugar (g)",
-                        "Calcium (mg)",
-                        "Magnesium (mg)",
-                        "Iron (mg)",
-                    ]
-
                     # Univer rows: header + data
-                    univer_rows = [univer_header] + rows_for_luckysheet
+                    univer_rows = [UNIVER_HEADER, *rows_for_luckysheet]
 
-                    with open(json_path, "w", encoding="utf-8") as f:
-                        json.dump({"rows": univer_rows}, f, ensure_ascii=False)
+                    payload = json.dumps({"rows": univer_rows}, ensure_ascii=False, separators=(",", ":"))
+                    write_atomic(json_path, payload.encode("utf-8"))
 
                     current_app.logger.info(
                         "Wrote Univer foods_table.json with %d data rows", len(rows_for_luckysheet)
@@ -595,12 +521,15 @@ def index():
 
         elif action == "remove_master":
             remove_ids = set(request.form.getlist("remove_id"))
-            my_food_list = [f for f in my_food_list if str(f.get("fdcId")) not in remove_ids]
-            session["my_food_list"] = my_food_list
+            kept = [f for f in my_food_list if str(f.get("fdcId")) not in remove_ids]
+            if len(kept) != len(my_food_list):
+                my_food_list = kept
+                dirty = True
 
         elif action == "clear_master":
-            my_food_list = []
-            session["my_food_list"] = my_food_list
+            if my_food_list:
+                my_food_list = []
+                dirty = True
 
         elif action == "choose_unit":
             fid = request.form.get("fid", "")
@@ -613,22 +542,23 @@ def index():
                 except Exception:
                     unit_grams = None
 
-            for f in my_food_list:
-                if str(f.get("fdcId")) == str(fid):
-                    pref = f.setdefault("pref", {})
-                    if unit_key in ("g", "cup", "tbsp", "tsp", "clove"):
-                        pref["unit_key"] = unit_key
-                    if unit_grams is not None:
-                        pref["unit_grams"] = unit_grams
-                    else:
-                        pref.pop("unit_grams", None)
-                    compute_portion_preview(f)
-                    break
+            f = next((f for f in my_food_list if str(f.get("fdcId")) == fid), None)
+            if f is not None:
+                pref = f.setdefault("pref", {})
+                if unit_key in _GRAMS_PER_UNIT_DEFAULT:  # the selectable units
+                    pref["unit_key"] = unit_key
+                if unit_grams is not None:
+                    pref["unit_grams"] = unit_grams
+                else:
+                    pref.pop("unit_grams", None)
+                compute_portion_preview(f)
+                dirty = True
+
+        if dirty:  # a no-op POST leaves the session (and its file) untouched
             session["my_food_list"] = my_food_list
 
-    # Normalize + recompute preview for display
+    # Normalize + recompute preview for display (compute_portion_preview normalizes in place)
     for f in my_food_list:
-        f["nutrients"] = normalize_per100(f.get("nutrients", {}))
         compute_portion_preview(f)
 
     return render_template(
@@ -30,4 +30,10 @@ LABEL_TO_NAME = {
     "sodium": "Sodium",
 }
 
-ALLOWED_TYPES = {"SR Legacy", "Foundation", "Survey (FNDDS)", "Branded"}
+ALLOWED_TYPES = frozenset({"SR Legacy", "Foundation", "Survey (FNDDS)", "Branded"})
+
+# Columns every saved history day carries in its "totals"
+ALL_HISTORY_NUTRIENTS = [
+    "Sodium", "Protein", "Carbs", "Fat", "Sat Fat", "Mono Fat", "Poly Fat",
+    "Sugar", "Potassium", "Calcium", "Magnesium", "Iron", "Calories",
+]
@@ -1,6 +1,8 @@
 # nutrition/services/food_portion_ref.py
 import csv
+from functools import lru_cache
 
+@lru_cache(maxsize=None)
 def _load_measure_units(path="data/measure_unit.csv"):
     mu_name = {}
     try:
@@ -15,6 +17,7 @@ def _load_measure_units(path="data/measure_unit.csv"):
         pass
     return mu_name
 
+@lru_cache(maxsize=None)
 def _load_food_meta(path="data/food.csv"):
     food_meta = {}
     try:
@@ -35,15 +38,36 @@ def _load_food_meta(path="data/food.csv"):
         pass
     return food_meta
 
+_COLS = (
+    "fdc_id", "description", "data_type", "brand_owner", "food_category",
+    "portion_description", "measure_unit", "amount", "gram_weight", "modifier"
+)
+
 def build_food_portion_rows(fdc_filter: set[int] | None = None,
                             path="data/food_portion.csv"):
+    """
+    Rows for the Food Portion Reference table, optionally limited to `fdc_filter`.
+    The CSVs are static for the life of the process, so the table is parsed once
+    and indexed by fdc_id; a filtered request only touches the rows it needs.
+    Callers get a fresh list (the row dicts are shared, don't mutate).
+    """
+    rows, by_fdc = _load_portion_table(path)
+    if not fdc_filter:
+        return list(rows), list(_COLS)
+    # Keep file order: gather row positions for the requested ids, then sort
+    positions = []
+    for fid in fdc_filter:
+        positions.extend(by_fdc.get(fid, ()))
+    positions.sort()
+    return [rows[i] for i in positions], list(_COLS)
+
+@lru_cache(maxsize=None)
+def _load_portion_table(path: str):
+    """All rows (file order) plus {fdc_id: (row positions, ...)}."""
     mu_name = _load_measure_units()
     food_meta = _load_food_meta()
     rows = []
-    cols = [
-        "fdc_id", "description", "data_type", "brand_owner", "food_category",
-        "portion_description", "measure_unit", "amount", "gram_weight", "modifier"
-    ]
+    by_fdc = {}
     try:
         with open(path, newline="", encoding="utf-8") as fh:
             r = csv.DictReader(fh)
@@ -52,8 +76,6 @@ def build_food_portion_rows(fdc_filter: set[int] | None = None,
                     fid = int(rec.get("fdc_id", 0))
                 except:
                     continue
-                if fdc_filter and fid not in fdc_filter:
-                    continue
                 mu = ""
                 mu_id = rec.get("measure_unit_id")
                 if mu_id:
@@ -62,6 +84,7 @@ def build_food_portion_rows(fdc_filter: set[int] | None = None,
                     except:
                         mu = ""
                 meta = food_meta.get(fid, {})
+                by_fdc.setdefault(fid, []).append(len(rows))
                 rows.append({
                     "fdc_id": fid,
                     "description": meta.get("description", ""),
@@ -76,4 +99,4 @@ def build_food_portion_rows(fdc_filter: set[int] | None = None,
                 })
     except FileNotFoundError:
         pass
-    return rows, cols
+    return tuple(rows), {fid: tuple(pos) for fid, pos in by_fdc.items()}
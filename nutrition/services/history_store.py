@@ -1,19 +1,31 @@
 # nutrition/services/history_store.py
 from __future__ import annotations
 import json
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
 from typing import List, Dict, Any
 
+try:
+    import orjson  # several times faster than json on large history files
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+from nutrition.constants import ALL_HISTORY_NUTRIENTS
+from nutrition.utils import write_atomic
+
 HISTORY_DIRNAME = "history"
+_ALL_HISTORY_SET = frozenset(ALL_HISTORY_NUTRIENTS)
 
+@lru_cache(maxsize=256)
 def _history_path(instance_path: str, user_id: str) -> Path:
     """
-    Returns instance/history/<user_id>.json
+    Returns instance/history/<user_id>.json. The directory is created by
+    _save_all when a file is written, not on every (read) lookup.
     """
     safe_user = user_id.replace("/", "_").replace("\\", "_")
-    p = Path(instance_path) / HISTORY_DIRNAME
-    p.mkdir(parents=True, exist_ok=True)
-    return p / f"{safe_user}.json"
+    return Path(instance_path) / HISTORY_DIRNAME / f"{safe_user}.json"
 
 def _load_all(instance_path: str, user_id: str) -> List[Dict[str, Any]]:
     path = _history_path(instance_path, user_id)
@@ -25,30 +37,143 @@ def _load_all(instance_path: str, user_id: str) -> List[Dict[str, Any]]:
         # Corrupt or empty file fallback
         return []
 
+def _load_all_readonly(instance_path: str, user_id: str):
+    """
+    Cached view of the user's days for read-only callers, reused until the file's
+    mtime/size change. Writers must use _load_all(), which returns fresh objects.
+    """
+    path = _history_path(instance_path, user_id)
+    try:
+        st = path.stat()
+    except OSError:
+        return ()
+    return _parse_days_cached(str(path), st.st_mtime_ns, st.st_size)
+
+@lru_cache(maxsize=256)
+def _parse_days_cached(path: str, mtime_ns: int, size: int) -> tuple:
+    try:
+        data = _loads(Path(path).read_bytes())
+    except Exception:
+        return ()
+    return tuple(data) if isinstance(data, list) else ()
+
 def _save_all(instance_path: str, user_id: str, days: List[Dict[str, Any]]) -> None:
     path = _history_path(instance_path, user_id)
-    path.write_text(json.dumps(days, ensure_ascii=False, indent=2), encoding="utf-8")
+    path.parent.mkdir(parents=True, exist_ok=True)  # recreated here if it was removed
+    write_atomic(path, json.dumps(days, ensure_ascii=False, indent=2).encode("utf-8"))
 
 def list_days(instance_path: str, user_id: str) -> List[Dict[str, Any]]:
     """
     Returns list of day dicts (each includes 'date', 'totals', and optionally 'entries').
     Sorted descending by date string (YYYY-MM-DD).
     """
-    days = _load_all(instance_path, user_id)
+    days = _load_all_readonly(instance_path, user_id)
     return sorted(days, key=lambda d: d.get("date", ""), reverse=True)
 
+def days_by_date(instance_path: str, user_id: str):
+    """
+    Returns (history, items): a read-only {date: day dict} view and the
+    ((date, day), ...) pairs sorted ascending by date, every day with complete
+    totals (see with_totals). Cached like _load_all_readonly, so treat both
+    as read-only.
+    """
+    path = _history_path(instance_path, user_id)
+    try:
+        st = path.stat()
+    except OSError:
+        return MappingProxyType({}), ()
+    return _index_days_cached(str(path), st.st_mtime_ns, st.st_size)
+
+@lru_cache(maxsize=256)
+def _index_days_cached(path: str, mtime_ns: int, size: int) -> tuple:
+    history = {
+        d["date"]: with_totals(d)
+        for d in _parse_days_cached(path, mtime_ns, size)
+        if isinstance(d, dict) and d.get("date")
+    }
+    return MappingProxyType(history), tuple(sorted(history.items()))
+
+def list_days_window(instance_path: str, user_id: str, dates) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns {date: day dict} for just the days whose date is in `dates`,
+    skipping the sort/index of the full history.
+    """
+    wanted = frozenset(dates)
+    return {
+        d["date"]: d
+        for d in _load_all_readonly(instance_path, user_id)
+        if d.get("date") in wanted
+    }
+
 def get_day(instance_path: str, user_id: str, date_str: str) -> Dict[str, Any] | None:
     """
     Returns a single day dict (with entries) for the given date.
     """
-    for d in _load_all(instance_path, user_id):
+    for d in _load_all_readonly(instance_path, user_id):
         if d.get("date") == date_str:
             return d
     return None
 
+def ensure_totals(day: Dict[str, Any]) -> bool:
+    """
+    Fill any ALL_HISTORY_NUTRIENTS missing from day['totals'] by summing its entries,
+    so readers can use day['totals'] as-is. Returns True if the day was changed.
+    """
+    totals = day.get("totals")
+    if isinstance(totals, dict) and _ALL_HISTORY_SET.issubset(totals):
+        return False
+    if not isinstance(totals, dict):
+        totals = {}
+    gets = [(e.get("nutrients") or {}).get for e in (day.get("entries") or []) if isinstance(e, dict)]
+    for k in ALL_HISTORY_NUTRIENTS:
+        if k in totals:
+            continue
+        t = 0.0
+        for get in gets:
+            v = get(k)
+            if isinstance(v, (int, float)):
+                t += v
+        totals[k] = float(t)
+    day["totals"] = totals
+    return True
+
+def with_totals(day: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    `day` itself if its totals are complete, else a copy with the missing ones
+    summed from its entries (see ensure_totals). Never modifies `day`, so the
+    stored file and other readers see the totals exactly as saved.
+    """
+    totals = day.get("totals")
+    if isinstance(totals, dict) and _ALL_HISTORY_SET.issubset(totals):
+        return day
+    day = dict(day, totals=dict(totals) if isinstance(totals, dict) else {})
+    ensure_totals(day)
+    return day
+
+def backfill_totals(instance_path: str, user_id: str) -> None:
+    """One-off migration: persist complete totals on days saved without them."""
+    days = _load_all(instance_path, user_id)
+    if not isinstance(days, list):
+        return
+    changed = False
+    for d in days:
+        if isinstance(d, dict) and ensure_totals(d):
+            changed = True
+    if changed:
+        _save_all(instance_path, user_id, days)
+
+def backfill_all_totals(instance_path: str) -> None:
+    """Run backfill_totals over every user's history file (`flask backfill-history`)."""
+    hist_dir = Path(instance_path) / HISTORY_DIRNAME
+    if not hist_dir.is_dir():
+        return
+    for p in hist_dir.glob("*.json"):
+        backfill_totals(instance_path, p.stem)
+
 def upsert_day(instance_path: str, user_id: str, day: Dict[str, Any]) -> None:
     """
     Inserts or replaces a day by 'date'. Expects keys: date, totals, entries.
+    Totals are stored as given; readers complete them (see with_totals).
     """
     if "date" not in day or "totals" not in day:
         raise ValueError("Day must include 'date' and 'totals'.")
@@ -59,7 +184,29 @@ def upsert_day(instance_path: str, user_id: str, day: Dict[str, Any]) -> None:
     else:
         days.append(day)
     _save_all(instance_path, user_id, days)
-# add near the other helpers
+
+def import_days(instance_path: str, user_id: str, days_by_date: Dict[str, Dict[str, Any]]) -> bool:
+    """
+    Adds {date: day} records for dates not already stored (stored days win),
+    with totals completed, in a single write. Returns False if the file isn't
+    a day list and nothing could be imported.
+    """
+    days = _load_all(instance_path, user_id)
+    if not isinstance(days, list):
+        return False
+    have = {d.get("date") for d in days if isinstance(d, dict)}
+    added = False
+    for date_str, rec in days_by_date.items():
+        if date_str in have or not isinstance(rec, dict):
+            continue
+        day = dict(rec, date=date_str)
+        ensure_totals(day)
+        days.append(day)
+        added = True
+    if added:
+        _save_all(instance_path, user_id, days)
+    return True
+
 def history_file_path(instance_path: str, user_id: str) -> str:
     """Public helper: absolute path to the user's history JSON file."""
     return str(_history_path(instance_path, user_id))
@@ -50,23 +50,29 @@ def derive_common_volumes_simple(portions: List[Dict]) -> List[Dict]:
         out.append(clone("tbsp", gw * 3.0, "derived"))
     return out
 
-def portion_match_from_labels(portions: List[Dict], user_unit: str):
-    if not user_unit or not portions: return None
-    u = user_unit.strip().lower()
-    UNIT_SYNONYMS = {
-        "clove": ["clove", "cloves"],
-        "cup": ["cup", "cups"],
-        "tbsp": ["tbsp", "tablespoon", "tablespoons"],
-        "tsp": ["tsp", "teaspoon", "teaspoons"],
-        "pound": ["lb", "lbs", "pound", "pounds"],
-        "ounce": ["oz", "ounce", "ounces"],
-        "whole": ["whole", "each", "piece"],
-        "undetermined": ["undetermined"]
-    }
-    cands = set([u])
-    for canon, syns in UNIT_SYNONYMS.items():
+_MATCH_UNIT_SYNONYMS = {
+    "clove": ["clove", "cloves"],
+    "cup": ["cup", "cups"],
+    "tbsp": ["tbsp", "tablespoon", "tablespoons"],
+    "tsp": ["tsp", "teaspoon", "teaspoons"],
+    "pound": ["lb", "lbs", "pound", "pounds"],
+    "ounce": ["oz", "ounce", "ounces"],
+    "whole": ["whole", "each", "piece"],
+    "undetermined": ["undetermined"]
+}
+
+@lru_cache(maxsize=256)
+def _unit_candidates(u: str) -> frozenset:
+    """All spellings that count as unit `u` (u itself plus its synonym group)."""
+    cands = {u}
+    for canon, syns in _MATCH_UNIT_SYNONYMS.items():
         if u == canon or u in syns:
             cands.add(canon); cands.update(syns)
+    return frozenset(cands)
+
+def portion_match_from_labels(portions: List[Dict], user_unit: str):
+    if not user_unit or not portions: return None
+    cands = _unit_candidates(user_unit.strip().lower())
     for p in portions:
         if p.get("unit") in cands:
             return p
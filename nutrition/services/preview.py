@@ -23,11 +23,15 @@ def compute_portion_preview(item: dict) -> None:
     else:
         grams = float(unit_grams) if unit_grams not in (None, "") else GRAMS_PER_UNIT_DEFAULT.get(unit_key, 0.0)
 
+    factor = grams * 0.01  # per-100g -> per-portion, hoisted out of the loop
     portion_nutrients = {}
     for k, v in per100.items():
+        if type(v) is float:  # canonical keys after normalize_per100: no conversion needed
+            portion_nutrients[k] = round(v * factor, 2)
+            continue
         try:
-            portion_nutrients[k] = round((float(v) * grams) / 100.0, 2)
-        except Exception:
+            portion_nutrients[k] = round(float(v) * factor, 2)
+        except (TypeError, ValueError):
             portion_nutrients[k] = 0.0
 
     item.setdefault("computed", {})
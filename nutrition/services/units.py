@@ -69,6 +69,11 @@ def typical_grams_for_unit(name: str, unit: str):
             return umap[u]
     return None
 
+# Precompiled for parse_line_to_qty_unit_name (called per line of a bulk paste)
+_COMMA_RE = re.compile(r"\s*,\s*")
+_QTY_REST_RE = re.compile(r"^(\d+(?:\.\d+)?|\d+\s*/\s*\d+)\s+(.*)$")
+_SYN2CANON = {syn: canon for canon, syns in UNIT_SYNONYMS.items() for syn in syns}
+
 def parse_line_to_qty_unit_name(line: str):
     """
     '4 garlic cloves' -> (4.0, 'clove', 'garlic')
@@ -77,8 +82,8 @@ def parse_line_to_qty_unit_name(line: str):
     """
     s = (line or "").strip().lower().replace("–", "-")
     if not s: return (None, None, None)
-    s = re.sub(r"\s*,\s*", " ", s)
-    m = re.match(r"^(\d+(?:\.\d+)?|\d+\s*/\s*\d+)\s+(.*)$", s)
+    s = _COMMA_RE.sub(" ", s)
+    m = _QTY_REST_RE.match(s)
     if not m: return (None, None, s)
     q_raw, rest = m.groups()
     if "/" in q_raw:
@@ -90,9 +95,8 @@ def parse_line_to_qty_unit_name(line: str):
     tokens = rest.split()
     if not tokens: return (qty, None, None)
 
-    syn2canon = {syn: canon for canon, syns in UNIT_SYNONYMS.items() for syn in syns}
     first = tokens[0]
-    unit = syn2canon.get(first)
+    unit = _SYN2CANON.get(first)
     if unit:
         name = " ".join(tokens[1:]).strip()
     else:
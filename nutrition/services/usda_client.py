@@ -18,7 +18,11 @@ def _get(url: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         pass
     return None
 
-def search_foods(query: str, page_size: int = 25, page_number: int = 1, data_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+class _SearchFailed(Exception):
+    """Raised inside the search cache so failed calls are not memoized."""
+
+@lru_cache(maxsize=256)
+def _search_cached(query: str, page_size: int, page_number: int, data_types: tuple) -> tuple:
     params = {
         "api_key": API_KEY,
         "query": query,
@@ -26,9 +30,22 @@ def search_foods(query: str, page_size: int = 25, page_number: int = 1, data_typ
         "pageNumber": page_number,
     }
     if data_types:
-        params["dataType"] = data_types
-    data = _get(f"{BASE}/foods/search", params) or {}
-    return data.get("foods", [])
+        params["dataType"] = list(data_types)
+    data = _get(f"{BASE}/foods/search", params)
+    if data is None:
+        raise _SearchFailed
+    return tuple(data.get("foods", []))
+
+def search_foods(query: str, page_size: int = 25, page_number: int = 1, data_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    USDA /foods/search, memoized per (query, page, data types) so refreshes, back
+    navigation and repeat recipe lookups skip the network. Treat the food dicts
+    as read-only; they are shared between callers.
+    """
+    try:
+        return list(_search_cached(query, page_size, page_number, tuple(sorted(data_types or ()))))
+    except _SearchFailed:
+        return []
 
 @lru_cache(maxsize=2048)
 def get_food_detail(fdc_id: str) -> Dict[str, Any]:
@@ -36,6 +53,30 @@ def get_food_detail(fdc_id: str) -> Dict[str, Any]:
     data = _get(f"{BASE}/food/{fdc_id}", params) or {}
     return data
 
+def get_food_details_bulk(fdc_ids: List[str], chunk: int = 20) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch several foods with one POST /foods call per `chunk` ids (FDC caps a call at 20).
+    Returns {fdcId (str): detail}; ids the API didn't return are simply absent.
+    """
+    out: Dict[str, Dict[str, Any]] = {}
+    ids = [str(i) for i in fdc_ids if i]
+    for start in range(0, len(ids), chunk):
+        batch = ids[start:start + chunk]
+        try:
+            r = requests.post(
+                f"{BASE}/foods",
+                params={"api_key": API_KEY},
+                json={"fdcIds": [int(i) if i.isdigit() else i for i in batch], "format": "full"},
+                timeout=DEFAULT_TIMEOUT,
+            )
+            data = r.json() if r.ok else []
+        except (requests.RequestException, ValueError):
+            data = []
+        for food in data or []:
+            if isinstance(food, dict) and food.get("fdcId") is not None:
+                out[str(food["fdcId"])] = food
+    return out
+
 def search_top_for_recipes(query: str, limit: int = 10) -> List[Dict[str, Any]]:
     """A thin wrapper used by the recipe picker (ordered by preferred types)."""
     foods = search_foods(query, page_size=limit)
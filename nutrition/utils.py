@@ -1,6 +1,11 @@
 # nutrition/utils.py
 import datetime
-from flask import session
+import os
+import re
+from flask import current_app, session
+
+# Plain decimal / scientific notation, as typed into numeric form fields
+_NUMBER_RE = re.compile(r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?")
 
 def today_str():
     return datetime.date.today().isoformat()
@@ -10,25 +15,39 @@ def get_targets():
     session.setdefault("targets", {"na": 1500, "k": 3400})
     return session["targets"]
 
+def session_user_id():
+    # History files are keyed by the signed-in user (see weekly_preview)
+    user = session.get("user") or {}
+    return user.get("email") or user.get("id") or "demo@example.com"
+
+def import_session_history():
+    """
+    Move a legacy session["history"] ({date: day}) into the signed-in user's
+    history_store file, then drop it from the session. Called on sign-in and
+    when a day is finalized, never from the history readers.
+    """
+    legacy = session.get("history")
+    if legacy is None:
+        return
+    from nutrition.services import history_store  # history_store imports this module
+    if not isinstance(legacy, dict) or history_store.import_days(
+        current_app.instance_path, session_user_id(), legacy
+    ):
+        session.pop("history", None)
+
 def get_diary(date=None):
     date = date or today_str()
     diary = session.setdefault("diary", {})  # {date: [entries]}
     diary.setdefault(date, [])
     return diary[date]
 
-def calc_progress(value: float, target: float):
-    """Return (percent, bootstrap_class) with traffic-light bands."""
-    if target <= 0:
-        pct = 0
-    else:
-        pct = min(100, round((value / target) * 100))
-    if pct < 80:
-        cls = "bg-success"
-    elif pct <= 100:
-        cls = "bg-warning text-dark"
-    else:
-        cls = "bg-danger"
-    return pct, cls
+def calc_progress(val, target):
+    """Return (bar percent capped at 100, class); over target shows red."""
+    if target <= 0: return 0, "bg-secondary"
+    pct = int(val * 100.0 / target + 0.5)
+    if pct > 100: return 100, "bg-danger"
+    if pct < 0: pct = 0
+    return pct, "bg-success"
 
 def sum_nutrients(entries):
     totals = {}
@@ -36,3 +55,25 @@ def sum_nutrients(entries):
         for k, v in (e.get("nutrients") or {}).items():
             totals[k] = totals.get(k, 0.0) + float(v or 0)
     return totals
+
+def write_atomic(path, data: bytes) -> None:
+    """Write to a sibling temp file, then os.replace() so readers never see a partial file."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb", buffering=1 << 20) as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def parse_float(raw, default=0.0):
+    """
+    float() for form/label input without raising: numbers pass through,
+    blank or non-numeric text returns `default`. The regex gate keeps the
+    invalid path exception-free.
+    """
+    if isinstance(raw, (int, float)):
+        return float(raw)
+    if not raw:
+        return default
+    s = raw.strip()
+    if _NUMBER_RE.fullmatch(s):
+        return float(s)
+    return default
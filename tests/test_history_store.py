@@ -0,0 +1,36 @@
+import json
+
+from nutrition.constants import ALL_HISTORY_NUTRIENTS
+from nutrition.services import history_store
+
+
+def _stored(tmp_path, uid="u"):
+    return json.loads(history_store._history_path(str(tmp_path), uid).read_text(encoding="utf-8"))
+
+
+def test_upsert_day_stores_totals_as_given(tmp_path):
+    day = {"date": "2026-01-01", "totals": {"Sodium": 5.0},
+           "entries": [{"nutrients": {"Sodium": 5.0, "Protein": 3.0}}]}
+    history_store.upsert_day(str(tmp_path), "u", day)
+    assert _stored(tmp_path)[0]["totals"] == {"Sodium": 5.0}
+
+
+def test_days_by_date_completes_totals_without_writing(tmp_path):
+    history_store.upsert_day(str(tmp_path), "u", {
+        "date": "2026-01-01", "totals": {"Sodium": 5.0},
+        "entries": [{"nutrients": {"Sodium": 5.0, "Protein": 3.0}}],
+    })
+    history, items = history_store.days_by_date(str(tmp_path), "u")
+    totals = history["2026-01-01"]["totals"]
+    assert set(ALL_HISTORY_NUTRIENTS) <= set(totals)
+    assert totals["Sodium"] == 5.0 and totals["Protein"] == 3.0
+    # the file and the other readers still see what was saved
+    assert _stored(tmp_path)[0]["totals"] == {"Sodium": 5.0}
+    assert history_store.get_day(str(tmp_path), "u", "2026-01-01")["totals"] == {"Sodium": 5.0}
+
+
+def test_backfill_all_totals_persists(tmp_path):
+    history_store.upsert_day(str(tmp_path), "u", {"date": "2026-01-01", "totals": {}, "entries": []})
+    history_store.backfill_all_totals(str(tmp_path))
+    assert set(_stored(tmp_path)[0]["totals"]) == set(ALL_HISTORY_NUTRIENTS)
+    assert not list((tmp_path / "history").glob("*.tmp"))
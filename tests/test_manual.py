@@ -0,0 +1,53 @@
+from flask import Blueprint, Flask
+import pytest
+
+from app_blueprints.manual import PORTION_DB, _bind_grams_fn, manual_bp
+
+
+def test_bind_grams_fn_two_arg_shape():
+    seen = []
+    fn = _bind_grams_fn(lambda text, portions: seen.append((text, portions)) or 40.0)
+    assert fn("40 g") == 40.0
+    assert seen == [("40 g", PORTION_DB)]
+
+
+def test_bind_grams_fn_one_arg_shape():
+    def one(text):
+        return 12.0
+    assert _bind_grams_fn(one) is one
+
+
+def test_bind_grams_fn_quantity_parser_shape_is_not_called():
+    # quantity_parser's (name, text, portions) never matched the old probe
+    def three(name, text, portions, registry_fn=None):
+        raise AssertionError("should not be called")
+    assert _bind_grams_fn(three) is None
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__, template_folder="../templates")
+    app.secret_key = "test"
+    app.register_blueprint(manual_bp)
+    daily = Blueprint("daily", __name__)
+    daily.add_url_rule("/daily", "daily", lambda: "")
+    app.register_blueprint(daily)
+    return app.test_client()
+
+
+def _submit(client, **fields):
+    client.post("/manual", data={"name": "Cereal", "Calories": "100", **fields})
+    with client.session_transaction() as sess:
+        return sess["my_food_list"][-1]
+
+
+def test_submit_keeps_values_without_explicit_grams(client):
+    for amount in ("2/3 cup", "3", "2 slices"):
+        food = _submit(client, serving_amount=amount)
+        assert food["servingSize"] is None
+        assert food["per100"]["Calories"] == 100.0
+
+
+def test_explicit_grams_win(client):
+    food = _submit(client, serving_amount="2 slices", serving_grams="25")
+    assert food["per100"]["Calories"] == 400.0
@@ -0,0 +1,29 @@
+import pytest
+
+from nutrition.services.nutrients import _WANTED, normalize_per100
+
+
+def _stored(**overrides):
+    n = dict.fromkeys(_WANTED, 1.0)
+    n.update(overrides)
+    return n
+
+
+@pytest.mark.parametrize("n", [
+    _stored(Calories=120.0),
+    _stored(Calories=120.0, Energy=250.0),
+    _stored(Calories=0.0, Energy=250.0),
+    _stored(Calories=0.0, **{"Energy (kJ)": 418.4}),
+    _stored(Calories=0.0),
+])
+def test_fast_path_matches_slow_path(n):
+    # an int Sodium keeps the same values off the all-float fast path
+    slow = normalize_per100({**n, "Sodium": 1})
+    assert normalize_per100(n) == slow
+
+
+def test_returns_a_copy():
+    n = _stored(Calories=120.0)
+    out = normalize_per100(n)
+    out["Sodium"] = 99.0
+    assert n["Sodium"] == 1.0
@@ -0,0 +1,23 @@
+import pytest
+
+from nutrition.utils import calc_progress
+
+
+@pytest.mark.parametrize("val, target", [(1520, 1500), (3000, 1500)])
+def test_over_target_is_red_and_capped(val, target):
+    assert calc_progress(val, target) == (100, "bg-danger")
+
+
+@pytest.mark.parametrize("val, target, pct", [
+    (0, 1500, 0),
+    (750, 1500, 50),
+    (1350, 1500, 90),
+    (1500, 1500, 100),
+    (-10, 1500, 0),
+])
+def test_under_target_is_green(val, target, pct):
+    assert calc_progress(val, target) == (pct, "bg-success")
+
+
+def test_no_target():
+    assert calc_progress(500, 0) == (0, "bg-secondary")